@@ -0,0 +1,141 @@
+#! /usr/bin/env python3
+
+
+import time
+import selectors
+
+# ============================================================================ #
+
+class AgentLoop(object):
+    """Drive all robots of a process from one thread
+    The server sockets of all robots are registered with a selector (epoll
+    on Linux). The loop sleeps until one of them becomes readable and then
+    runs one step of exactly the robots that received perceptor messages,
+    so waiting robots cost no CPU at all.
+    Robots must be created with autostart=False and must not be started,
+    the loop takes the place of their life threads.
+    A server that pauses, e.g. at kickoff, only makes the loop wait. Robots
+    are reconnected once their socket reports that the connection was
+    closed or failed, timeout only bounds how long the selector sleeps
+    before the loop checks for stop() and the duration of run().
+    The loop accounts for the time spent sleeping in the selector versus
+    the time spent running robot steps, every robot's CycleStats for the
+    time between its steps versus its step time.
+    If a collector is given (see profiling.IdleCollector), the garbage
+    collector only runs before the loop goes to sleep.
+    Robots created with profile=True are profiled while run() drives
+    them, and report their allocations per stage when it returns."""
+
+    def __init__(self, robots=(), timeout=1.0, collector=None):
+        self.selector = selectors.DefaultSelector()
+        self.robots   = []
+        self.timeout  = timeout # seconds the selector sleeps at most
+        self.running  = False
+        self.collector = collector
+
+        # idle accounting
+        self.waitTime    = 0.0
+        self.computeTime = 0.0
+
+        for robot in robots:
+            self.add(robot)
+
+# ==================================== #
+
+    def add(self, robot):
+        """Let the loop drive robot"""
+        robot.alive = True
+        self.selector.register(robot.pns.socket, selectors.EVENT_READ, robot)
+        self.robots.append(robot)
+        if self.running:
+            robot.start_profiling()
+
+# ==================================== #
+
+    def remove(self, robot):
+        """Stop driving robot"""
+        self.selector.unregister(robot.pns.socket)
+        self.robots.remove(robot)
+
+# ==================================== #
+
+    def run(self, duration=None):
+        """Run until stop() is called, all robots died
+        or duration seconds have passed"""
+
+        self.running = True
+        start = time.time()
+
+        driven = list(self.robots)
+        for robot in driven:
+            robot.start_profiling()
+
+        while self.running and len(self.robots) > 0:
+            if duration is not None and time.time() - start >= duration:
+                break
+
+            if self.collector is not None:
+                self.collector.idle()
+
+            waitStart    = time.time()
+            events       = self.selector.select(self.timeout)
+            computeStart = time.time()
+
+            # the server did not send anything to anyone, keep waiting,
+            # but do not take the pause for lag once it sends again
+            if len(events) == 0:
+                for robot in self.robots:
+                    robot.resync()
+
+            for key, mask in events:
+                robot = key.data
+                if not robot.alive:
+                    continue
+                try:
+                    messages = robot.pns.receive_messages(block=False)
+                    if len(messages) > 0:
+                        robot.step(messages)
+                except OSError as error:
+                    self._recover(robot, error)
+
+            # forget robots that died in the meantime
+            for robot in list(self.robots):
+                if not robot.alive:
+                    self.remove(robot)
+
+            self.waitTime    += computeStart - waitStart
+            self.computeTime += time.time() - computeStart
+
+        self.running = False
+        for robot in driven + self.robots:
+            robot.stop_profiling()
+
+# ==================================== #
+
+    def get_load(self):
+        """Fraction of the time the loop was busy running robots"""
+        total = self.waitTime + self.computeTime
+        if total == 0:
+            return 0.0
+        return self.computeTime / total
+
+# ==================================== #
+
+    def stop(self):
+        """Let run() return after the current iteration"""
+        self.running = False
+
+# ==================================== #
+
+    def _recover(self, robot, error):
+        """Reconnect a robot whose connection was lost.
+        This blocks the loop until the robot is back."""
+
+        if not robot.alive:
+            return
+
+        print("Robot {} lost connection to server: {}".format(robot.agentID, error))
+        self.remove(robot)
+        robot.reconnect()
+        if robot.alive:
+            self.add(robot)
@@ -0,0 +1,246 @@
+#! /usr/bin/env python3
+
+
+from simpleAgent import SchedulerConflict, FLUSHED
+
+# ============================================================================ #
+
+# Constants
+SUCCESS = 'success'
+FAILURE = 'failure'
+RUNNING = 'running'
+
+# ============================================================================ #
+
+class Node(object):
+    """Base class of all behaviour tree nodes
+    A tree is ticked once per cycle by NaoRobot.step() before the scheduled
+    movements are run, except while the robot gets up after a fall.
+    Every node returns SUCCESS, FAILURE or RUNNING.
+    Nodes keep state between ticks, so every robot needs its own tree."""
+
+    def tick(self, robot):
+        raise NotImplementedError
+
+    def reset(self):
+        """Forget any running state, e.g. when the tree switched to
+        another branch while this one was running"""
+        pass
+
+
+# ============================================================================ #
+
+
+class Condition(Node):
+    """Leaf that evaluates a predicate of the robot
+    The result is memoized per cycle, so a condition that appears in
+    several places of a tree is only evaluated once per cycle."""
+
+    def __init__(self, predicate, name=None):
+        self.predicate = predicate
+        self.name      = name or predicate.__name__
+        self.cycle     = None
+        self.value     = None
+
+    def evaluate(self, robot):
+        if self.cycle != robot.cycle:
+            self.value = bool(self.predicate(robot))
+            self.cycle = robot.cycle
+        return self.value
+
+    def tick(self, robot):
+        if self.evaluate(robot):
+            return SUCCESS
+        return FAILURE
+
+
+# ============================================================================ #
+
+
+class Action(Node):
+    """Leaf that calls function(robot, **kwargs) every tick
+    The function returns one of the node states, "done" counts as SUCCESS
+    and anything else as RUNNING, like functions in the MovementScheduler."""
+
+    def __init__(self, function, kwargs=None):
+        self.function = function
+        self.kwargs   = kwargs or {}
+
+    def tick(self, robot):
+        status = self.function(robot, **self.kwargs)
+        if status == "done":
+            return SUCCESS
+        if status in (SUCCESS, FAILURE, RUNNING):
+            return status
+        return RUNNING
+
+
+# ============================================================================ #
+
+
+class Schedule(Node):
+    """Leaf that hands a movement to the MovementScheduler
+    function is the name of a robot method such as 'move_hj_to'.
+    On the first tick the movement [function, kwargs] is appended to the
+    robot's msched. The node is RUNNING until the scheduler reports the
+    movement as done. If the scheduler rejects it because the same joint
+    is already in use, or drops it, e.g. because the robot fell,
+    the node fails.
+    Resetting the node while the movement runs takes it out of the
+    scheduler again and stops its joint."""
+
+    def __init__(self, function, kwargs):
+        self.function = function
+        self.kwargs   = kwargs
+        self.done     = None
+        self.robot    = None
+        self.item     = None # the scheduled movement
+
+    def tick(self, robot):
+        if self.done is None:
+            self.done = [False]
+            self.item = [getattr(robot, self.function), dict(self.kwargs), self.done]
+            try:
+                robot.msched.append(self.item)
+            except SchedulerConflict:
+                self.done = None
+                self.item = None
+                return FAILURE
+            self.robot = robot
+        if self.done[0] == FLUSHED:
+            self.done = None
+            return FAILURE
+        if self.done[0]:
+            self.done = None
+            return SUCCESS
+        return RUNNING
+
+    def reset(self):
+        if self.done is not None and self.done[0] is False:
+            if self.robot.msched.cancel(self.item) and 'hj' in self.item[1]:
+                self.robot.release_hj(self.item[1]['hj'])
+        self.done = None
+        self.item = None
+
+
+# ============================================================================ #
+
+
+class Sequence(Node):
+    """Tick children in order as long as they succeed
+    Remembers a RUNNING child and continues with it on the next tick."""
+
+    def __init__(self, *children):
+        self.children = children
+        self.current  = 0
+
+    def tick(self, robot):
+        while self.current < len(self.children):
+            status = self.children[self.current].tick(robot)
+            if status == RUNNING:
+                return RUNNING
+            if status == FAILURE:
+                self.reset()
+                return FAILURE
+            self.current += 1
+        self.reset()
+        return SUCCESS
+
+    def reset(self):
+        for child in self.children[:self.current+1]:
+            child.reset()
+        self.current = 0
+
+
+# ============================================================================ #
+
+
+class Selector(Node):
+    """Tick children in order until one does not fail
+    Children are re-evaluated from the start every tick, so a higher
+    priority branch takes over as soon as its conditions hold. A lower
+    priority branch that was running is reset then."""
+
+    def __init__(self, *children):
+        self.children = children
+        self.running  = None
+
+    def tick(self, robot):
+        for i, child in enumerate(self.children):
+            status = child.tick(robot)
+            if status == FAILURE:
+                continue
+            if self.running is not None and self.running != i:
+                self.children[self.running].reset()
+            self.running = i if status == RUNNING else None
+            return status
+        self.running = None
+        return FAILURE
+
+    def reset(self):
+        if self.running is not None:
+            self.children[self.running].reset()
+        self.running = None
+
+
+# ============================================================================ #
+
+
+class Memo(Node):
+    """Only re-evaluate the child subtree if its inputs changed
+    inputs(robot) must return something hashable that captures everything
+    the subtree decides on, e.g. a tuple of condition values. As long as
+    it returns the same value and the subtree is not RUNNING, the previous
+    result is returned without ticking the subtree."""
+
+    def __init__(self, inputs, child):
+        self.inputs = inputs
+        self.child  = child
+        self.key    = None
+        self.status = None
+
+    def tick(self, robot):
+        key = self.inputs(robot)
+        if self.status is not None and self.status != RUNNING and key == self.key:
+            return self.status
+        self.key    = key
+        self.status = self.child.tick(robot)
+        return self.status
+
+    def reset(self):
+        self.child.reset()
+        self.key    = None
+        self.status = None
+
+
+# ============================================================================ #
+
+
+class PlayModeSwitch(Node):
+    """Run the subtree registered for the current play mode
+    When the play mode changes, the subtree of the previous play mode
+    is reset. Play modes without subtree run default, if given."""
+
+    def __init__(self, subtrees, default=None):
+        self.subtrees = subtrees
+        self.default  = default
+        self.playmode = None
+
+    def tick(self, robot):
+        playmode = robot.gamestate.get_playmode()
+        if playmode != self.playmode:
+            previous = self.subtrees.get(self.playmode, self.default)
+            if previous is not None:
+                previous.reset()
+            self.playmode = playmode
+
+        subtree = self.subtrees.get(playmode, self.default)
+        if subtree is None:
+            return FAILURE
+        return subtree.tick(robot)
+
+    def reset(self):
+        subtree = self.subtrees.get(self.playmode, self.default)
+        if subtree is not None:
+            subtree.reset()
+        self.playmode = None
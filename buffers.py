@@ -0,0 +1,52 @@
+#! /usr/bin/env python3
+
+
+# ============================================================================ #
+
+class DoubleBuffer(object):
+    """Lock-free double buffer to hand state from one writer thread
+    to any number of reader threads.
+    The writer fills the back buffer in place and calls publish() to swap
+    back and front. Readers never take a lock. Instead they check a
+    sequence number before and after reading the front buffer and retry if
+    a swap happened in between (seqlock), because after a swap the old front
+    buffer becomes the writer's back buffer and may be overwritten."""
+
+    def __init__(self, front, back):
+        self.front    = front
+        self.back     = back
+        self.sequence = 0
+
+# ==================================== #
+
+    def publish(self):
+        """Swap front and back buffer.
+        Must only be called by the single writer thread once the
+        back buffer has been filled completely."""
+        self.front, self.back = self.back, self.front
+        self.sequence += 1
+
+# ==================================== #
+
+    def read(self, function=None):
+        """Apply function to the front buffer and return the result.
+        The result is guaranteed to stem from one consistent buffer.
+        If function is None, the front buffer's copy() method is used.
+        Function should copy out what it needs instead of returning
+        references into the buffer, which are only valid until the
+        writer publishes the next one."""
+
+        if function is None:
+            function = lambda buffer: buffer.copy()
+
+        while True:
+            sequence = self.sequence
+            result   = function(self.front)
+            if sequence == self.sequence:
+                return result
+
+# ==================================== #
+
+    def get_sequence(self):
+        """Number of buffers published so far"""
+        return self.sequence
@@ -0,0 +1,157 @@
+#! /usr/bin/env python3
+
+
+import numpy as np
+
+# ============================================================================ #
+
+class JointController(object):
+    """Closed-loop speed control of all hinge joints at once
+    The server moves a hinge joint at the speed last sent to its effector.
+    For every joint with a target the controller computes that speed from
+    a PID law on the angle error plus feed-forward of the target's motion,
+    limited to the joint's maximum speed and acceleration from the model.
+    The speed is also kept low enough to stop at the target with the
+    maximum deceleration, so joints arrive without overshoot.
+    The perceived angle lags the sent speed by delay cycles, the movement
+    still to come from the speeds sent in these cycles is subtracted
+    from the error.
+    gain and delay describe the joint response and can be fitted to
+    recorded frames with calibrate().
+    All per joint state lives in numpy arrays in model index order,
+    update() computes the speeds of all joints in one pass."""
+
+    def __init__(self, model, kp=0.7, ki=0.02, kd=0.1, accuracy=0.1, delay=1):
+        n = len(model)
+        self.maxSpeed        = model.maxSpeed.copy()
+        self.maxAcceleration = model.maxAcceleration.copy()
+
+        self.kp       = np.full(n, kp)
+        self.ki       = np.full(n, ki)
+        self.kd       = np.full(n, kd)
+        self.gain     = np.ones(n) # degree moved per degree/cycle of speed
+        self.accuracy = accuracy   # degree
+
+        self.active     = np.zeros(n, dtype=bool)
+        self.fresh      = np.zeros(n, dtype=bool) # no error known yet
+        self.target     = np.zeros(n)
+        self.lastTarget = np.zeros(n)
+        self.speedLimit = np.zeros(n)
+        self.integral   = np.zeros(n)
+        self.lastError  = np.zeros(n)
+        self.rate       = np.zeros(n) # speed sent last
+
+        # speeds sent in the last delay cycles, most recent first
+        self.set_delay(delay)
+
+# ==================================== #
+
+    def set_delay(self, delay):
+        """Number of cycles until a speed shows in the perceived angle"""
+        self.delay    = delay
+        self.inflight = np.zeros((delay, len(self.rate)))
+
+# ==================================== #
+
+    def set_target(self, i, angle, speed):
+        """Let joint i move to angle with at most speed degree/cycle"""
+
+        if not self.active[i]:
+            self.active[i]     = True
+            self.fresh[i]      = True
+            self.integral[i]   = 0.0
+            self.lastTarget[i] = angle
+
+        self.target[i]     = angle
+        self.speedLimit[i] = min(speed, self.maxSpeed[i])
+
+# ==================================== #
+
+    def reached(self, i, angle):
+        """True if joint i is at its target angle"""
+        return abs(self.target[i] - angle) <= self.accuracy
+
+# ==================================== #
+
+    def release(self, i):
+        """Stop controlling joint i, the caller stops the joint"""
+        self.active[i]      = False
+        self.rate[i]        = 0.0
+        self.inflight[:, i] = 0.0
+
+    def stop(self):
+        """Stop controlling all joints, e.g. after the robot was reset"""
+        self.active[:]   = False
+        self.rate[:]     = 0.0
+        self.inflight[:] = 0.0
+
+# ==================================== #
+
+    def update(self, angles):
+        """Compute the speeds of all controlled joints from the perceived angles
+        Return the indices of the joints whose speed changed,
+        the new speeds are in rate."""
+
+        active = self.active
+        if not active.any():
+            return ()
+
+        error     = self.target - angles
+        predicted = error - self.gain * self.inflight.sum(axis=0)
+        derivative = np.where(self.fresh, 0.0, predicted - self.lastError)
+        integral  = self.integral + predicted
+
+        rate = (self.target - self.lastTarget
+                + self.kp * predicted + self.ki * integral + self.kd * derivative) / self.gain
+
+        # slow enough to stop at the target, within speed and acceleration limits
+        limit = np.minimum(self.speedLimit,
+                np.sqrt(2.0 * self.maxAcceleration * np.abs(predicted)))
+        limited = np.clip(rate, -limit, limit)
+        limited = np.clip(limited, self.rate - self.maxAcceleration,
+                                   self.rate + self.maxAcceleration)
+
+        # no integration while saturated
+        free = limited == rate
+        self.integral[active & free] = integral[active & free]
+
+        changed = np.flatnonzero(active & (limited != self.rate))
+        self.rate[active]       = limited[active]
+        self.lastError[active]  = predicted[active]
+        self.lastTarget[active] = self.target[active]
+        self.fresh[active]      = False
+        if self.delay > 0:
+            self.inflight[1:] = self.inflight[:-1]
+            self.inflight[0]  = self.rate
+
+        return changed
+
+# ==================================== #
+
+    def calibrate(self, angles, rates, maxDelay=3):
+        """Fit gain and delay to recorded frames
+        angles are the perceived angles and rates the speeds sent in the
+        same cycles, both arrays of shape (cycles, joints). The delay with
+        the smallest residual over all joints is used, joints that never
+        moved keep their gain. Return gain and delay."""
+
+        angles = np.asarray(angles, dtype=float)
+        rates  = np.asarray(rates,  dtype=float)
+        steps  = angles[1:] - angles[:-1]
+
+        best = None
+        for delay in range(maxDelay + 1):
+            moved = steps[delay:]
+            sent  = rates[:len(rates) - 1 - delay]
+            power = (sent * sent).sum(axis=0)
+            gain  = np.where(power > 0, (moved * sent).sum(axis=0) / np.maximum(power, 1e-12),
+                             self.gain)
+            residual = ((moved - gain * sent)**2).sum() / max(len(moved), 1)
+            if best is None or residual < best[0]:
+                best = (residual, gain, delay)
+
+        residual, gain, delay = best
+        self.gain[:] = np.where(gain > 0.1, gain, self.gain)
+        self.set_delay(delay)
+
+        return self.gain, self.delay
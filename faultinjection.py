@@ -0,0 +1,315 @@
+#! /usr/bin/env python3
+"""Inject network faults between the simulation server and the agents.
+A Scenario read from a JSON file is handed to NaoRobot (or PNS) as
+transport. Every server connection is then wrapped by a FaultyTransport
+that delays, bundles, splits, throttles or drops the perceptor messages
+of the server as the current phase of the scenario says. Effector
+messages go out unchanged.
+
+A scenario file looks like this, all phase keys are optional:
+
+    {"seed": 1,
+     "repeat": false,
+     "phases": [
+        {"duration": 5.0},
+        {"duration": 5.0, "latency": {"distribution": "normal", "mean": 0.04, "std": 0.02}},
+        {"duration": 5.0, "burst": 5},
+        {"duration": 5.0, "partial": 0.5, "partialDelay": 0.01},
+        {"duration": 5.0, "bandwidth": 50000},
+        {"duration": 5.0, "drop": 0.1}]}
+
+duration        seconds the phase lasts, from the first connection on
+latency         delay of every message, distributions: constant (value),
+                uniform (low, high), normal (mean, std), exponential (mean)
+burst           hold messages back and deliver this many at once
+partial         probability that a message arrives in two pieces,
+                partialDelay seconds apart
+bandwidth       bytes per second the connection can deliver
+drop            probability that a message is lost, e.g. a server cycle
+                that was never sent
+After the last phase, the scenario starts over if repeat is true and
+otherwise passes everything through unchanged.
+
+usage: faultinjection.py scenario.json [--server host:port] [--duration sec.]"""
+
+
+import sys, time, json, socket, struct, threading, queue, random, argparse
+
+# ============================================================================ #
+
+class Scenario(object):
+    """Timeline of network faults, see the module documentation
+    Calling the scenario with a connected socket returns the socket wrapped
+    in a FaultyTransport. All connections made with one scenario, e.g.
+    after a reconnect, share the timeline and the statistics."""
+
+    def __init__(self, phases, seed=None, repeat=False):
+        self.phases    = phases
+        self.repeat    = repeat
+        self.rng       = random.Random(seed)
+        self.start     = None
+        self.lock      = threading.Lock()
+
+        # statistics
+        self.messages  = 0
+        self.dropped   = 0
+        self.split     = 0
+        self.delay     = 0.0 # total delay of all delivered messages
+
+# ==================================== #
+
+    @classmethod
+    def load(cls, path):
+        """Read a scenario from a JSON file"""
+        with open(path) as scenarioFile:
+            description = json.load(scenarioFile)
+        return cls(description.get('phases', []), description.get('seed'),
+                   description.get('repeat', False))
+
+# ==================================== #
+
+    def __call__(self, sock):
+        if self.start is None:
+            self.start = time.time()
+        return FaultyTransport(sock, self)
+
+# ==================================== #
+
+    def get_phase(self, now):
+        """Phase at the given time, an empty phase once the scenario is over"""
+
+        elapsed = now - self.start
+        total   = sum(phase.get('duration', 0.0) for phase in self.phases)
+        if self.repeat and total > 0:
+            elapsed %= total
+
+        for phase in self.phases:
+            elapsed -= phase.get('duration', 0.0)
+            if elapsed < 0:
+                return phase
+        return {}
+
+# ==================================== #
+
+    def sample_latency(self, latency):
+        """Draw a delay in seconds from a latency description"""
+
+        if latency is None:
+            return 0.0
+
+        distribution = latency.get('distribution', 'constant')
+        if distribution == 'constant':
+            delay = latency['value']
+        elif distribution == 'uniform':
+            delay = self.rng.uniform(latency['low'], latency['high'])
+        elif distribution == 'normal':
+            delay = self.rng.gauss(latency['mean'], latency['std'])
+        elif distribution == 'exponential':
+            delay = self.rng.expovariate(1.0 / latency['mean'])
+        else:
+            raise ValueError("Unknown latency distribution '{}'".format(distribution))
+
+        return max(delay, 0.0)
+
+# ==================================== #
+
+    def __str__(self):
+        delivered = self.messages - self.dropped
+        return "{} messages, {} dropped, {} split, mean delay {:.1f} ms".format(
+                self.messages, self.dropped, self.split,
+                1000.0 * self.delay / max(delivered, 1))
+
+
+# ============================================================================ #
+
+
+class FaultyTransport(object):
+    """Server connection with faults injected into the received messages
+    A reader thread takes the perceptor messages from the server socket and
+    decides when and how each one is delivered. A writer thread delivers
+    them into one end of a socket pair, in order. The agent reads from the
+    other end, so timeouts and selectors work like with the server socket.
+    Messages are delivered in the order they were sent, as with TCP,
+    so a delayed message also holds back the ones behind it."""
+
+    def __init__(self, sock, scenario):
+        self.server   = sock
+        self.scenario = scenario
+
+        self.agentEnd, self.faultEnd = socket.socketpair()
+        self.agentEnd.settimeout(sock.gettimeout())
+        self.server.settimeout(None)
+
+        self.deliveries   = queue.Queue() # (time, bytes), None at the end
+        self.lastDelivery = 0.0           # when the previous message is through
+        self.held         = []            # messages of the current burst
+
+        self.reader = threading.Thread(target=self._read,  daemon=True)
+        self.writer = threading.Thread(target=self._write, daemon=True)
+        self.reader.start()
+        self.writer.start()
+
+# ==================================== #
+
+    # socket interface used by PNS
+
+    def send(self, data):
+        return self.server.send(data)
+
+    def recv_into(self, buffer, nbytes=0):
+        return self.agentEnd.recv_into(buffer, nbytes)
+
+    def settimeout(self, timeout):
+        self.agentEnd.settimeout(timeout)
+
+    def gettimeout(self):
+        return self.agentEnd.gettimeout()
+
+    def fileno(self):
+        return self.agentEnd.fileno()
+
+    def send_fileno(self):
+        # effectors go straight to the server, its send buffer is what fills up
+        return self.server.fileno()
+
+    def close(self):
+        # wakes up the reader thread
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        for sock in (self.server, self.agentEnd, self.faultEnd):
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+# ==================================== #
+
+    def _read(self):
+        """Split the server stream into messages and schedule them"""
+
+        buffer = bytearray()
+        try:
+            while True:
+                data = self.server.recv(65536)
+                if len(data) == 0:
+                    break
+                buffer += data
+                while len(buffer) >= 4:
+                    length = struct.unpack_from('!I', buffer)[0]
+                    if len(buffer) < 4 + length:
+                        break
+                    self._schedule(bytes(buffer[:4+length]))
+                    del buffer[:4+length]
+        except OSError:
+            pass
+        finally:
+            self.deliveries.put(None)
+
+# ==================================== #
+
+    def _schedule(self, message):
+        """Decide when and in how many pieces message is delivered"""
+
+        scenario = self.scenario
+        now      = time.time()
+        phase    = scenario.get_phase(now)
+
+        with scenario.lock:
+            scenario.messages += 1
+            if scenario.rng.random() < phase.get('drop', 0.0):
+                scenario.dropped += 1
+                return
+            delay = scenario.sample_latency(phase.get('latency'))
+            split = scenario.rng.random() < phase.get('partial', 0.0)
+
+        # collect a burst and deliver it with its last message
+        burst = phase.get('burst', 1)
+        self.held.append(message)
+        if len(self.held) < burst:
+            return
+        messages  = self.held
+        self.held = []
+
+        bandwidth    = phase.get('bandwidth')
+        partialDelay = phase.get('partialDelay', 0.01)
+        delivery     = now + delay
+        for message in messages:
+            # in order, and not faster than the bandwidth allows
+            delivery = max(delivery, self.lastDelivery)
+            if split:
+                half = len(message) // 2
+                self.deliveries.put((delivery, message[:half]))
+                self.deliveries.put((delivery + partialDelay, message[half:]))
+                end = delivery + partialDelay
+            else:
+                self.deliveries.put((delivery, message))
+                end = delivery
+            if bandwidth:
+                end = max(end, delivery + len(message) / bandwidth)
+            self.lastDelivery = end
+
+            with scenario.lock:
+                scenario.delay += delivery - now
+                scenario.split += split
+
+# ==================================== #
+
+    def _write(self):
+        """Deliver the scheduled messages to the agent on time"""
+
+        try:
+            while True:
+                item = self.deliveries.get()
+                if item is None:
+                    break
+                delivery, data = item
+                wait = delivery - time.time()
+                if wait > 0:
+                    time.sleep(wait)
+                self.faultEnd.sendall(data)
+        except OSError:
+            pass
+        finally:
+            # the agent sees the server closing the connection
+            try:
+                self.faultEnd.close()
+            except OSError:
+                pass
+
+
+# ============================================================================ #
+
+#####################
+# UTILITY FUNCTIONS #
+#####################
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Run a robot with injected network faults")
+    parser.add_argument('scenario')
+    parser.add_argument('--server',   default='localhost:3100', help="host:port")
+    parser.add_argument('--duration', type=float, default=None,
+            help="seconds to run, default: the length of the scenario")
+    parser.add_argument('--profile',  action='store_true',
+            help="report the memory allocated per stage of the robot's cycle")
+    args = parser.parse_args(argv)
+
+    import simpleAgent
+
+    scenario = Scenario.load(args.scenario)
+    duration = args.duration
+    if duration is None:
+        duration = sum(phase.get('duration', 0.0) for phase in scenario.phases)
+
+    host, port = args.server.split(':')
+    robot = simpleAgent.NaoRobot(1, 'faults', host=host, port=int(port), transport=scenario,
+            profile=args.profile)
+    time.sleep(duration)
+    robot.die()
+
+    print("network: {}".format(scenario))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,33 @@
+#! /usr/bin/env python3
+
+
+import importlib
+
+# ============================================================================ #
+
+class LazyModule(object):
+    """Stand-in for a module that is only imported on first attribute access
+    Once imported, the module's namespace is copied into the stand-in, so
+    later attribute lookups cost the same as with the real module."""
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+
+    def __getattr__(self, attribute):
+        module = importlib.import_module(self._name)
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attribute)
+
+    def __setattr__(self, attribute, value):
+        raise AttributeError("Cannot set attributes of lazily imported module '{}'".format(self._name))
+
+
+# ============================================================================ #
+
+#####################
+# UTILITY FUNCTIONS #
+#####################
+
+def lazy_import(name):
+    """Return a stand-in for module name that imports it on first use"""
+    return LazyModule(name)
@@ -0,0 +1,198 @@
+#! /usr/bin/env python3
+
+
+import math
+import numpy as np
+
+from vision import LANDMARKS
+
+# ============================================================================ #
+
+# Constants
+FIELD_LENGTH = 30.0 # meter
+FIELD_WIDTH  = 20.0 # meter
+GOAL_WIDTH   =  2.1 # meter
+GOAL_HEIGHT  =  0.8 # meter
+
+# sides a team plays on
+LEFT  = 'left'
+RIGHT = 'right'
+
+# field coordinates of the landmarks for the team playing on the left side
+LANDMARK_POSITIONS = {'F1L': (-FIELD_LENGTH/2,  FIELD_WIDTH/2, 0.0),
+                      'F2L': (-FIELD_LENGTH/2, -FIELD_WIDTH/2, 0.0),
+                      'F1R': ( FIELD_LENGTH/2,  FIELD_WIDTH/2, 0.0),
+                      'F2R': ( FIELD_LENGTH/2, -FIELD_WIDTH/2, 0.0),
+                      'G1L': (-FIELD_LENGTH/2,  GOAL_WIDTH/2, GOAL_HEIGHT),
+                      'G2L': (-FIELD_LENGTH/2, -GOAL_WIDTH/2, GOAL_HEIGHT),
+                      'G1R': ( FIELD_LENGTH/2,  GOAL_WIDTH/2, GOAL_HEIGHT),
+                      'G2R': ( FIELD_LENGTH/2, -GOAL_WIDTH/2, GOAL_HEIGHT)}
+
+# ============================================================================ #
+
+class ParticleFilter(object):
+    """Monte Carlo self-localization on the field
+    Estimates the pose (x, y, theta) of the robot with theta in degree
+    relative to the x-axis. All particles are propagated and weighted
+    at once with numpy, so the cost per cycle is a handful of array
+    operations of size nparticles x nlandmarks.
+    The number of particles trades accuracy for CPU time.
+    Poses are in the coordinates of the own team, with the own goal at
+    negative x, like beam coordinates. For the team playing on the right
+    side, the landmarks are point reflected at the center point."""
+
+    def __init__(self, nparticles=200, x=0.0, y=0.0, theta=0.0,
+            motionNoise=(0.01, 0.01, 0.5), distanceNoise=0.1, bearingNoise=5.0,
+            seed=None, side=LEFT):
+        """motionNoise      standard deviation of x, y and theta per cycle
+        distanceNoise    relative standard deviation of observed distances
+        bearingNoise     standard deviation of observed bearings in degree
+        side             LEFT or RIGHT, the side the own team plays on"""
+
+        self.nparticles    = nparticles
+        self.motionNoise   = np.array(motionNoise, dtype=float)
+        self.distanceNoise = distanceNoise
+        self.bearingNoise  = bearingNoise
+        self.rng           = np.random.default_rng(seed)
+
+        self.set_side(side)
+
+        self.particles = np.zeros((nparticles, 3))
+        self.noise     = np.zeros((nparticles, 3)) # reused by predict()
+        self.weights   = np.full(nparticles, 1.0/nparticles)
+        self.pose      = np.zeros(3)
+
+        self.reset(x, y, theta)
+
+# ==================================== #
+
+    def reset(self, x, y, theta, spread=(0.05, 0.05, 2.0)):
+        """Scatter all particles around the given pose,
+        e.g. after the robot was beamed"""
+
+        self.particles[:] = (x, y, theta)
+        self.particles   += self.rng.normal(0.0, 1.0, self.particles.shape) * spread
+        self.weights[:]   = 1.0/self.nparticles
+        self.pose[:]      = (x, y, theta)
+
+# ==================================== #
+
+    def set_side(self, side):
+        """Use the landmark positions as seen by the team playing on side"""
+
+        if side not in (LEFT, RIGHT):
+            raise ValueError("Unknown side '{}'".format(side))
+        self.side      = side
+        self.landmarks = np.array([LANDMARK_POSITIONS[name][:2] for name in LANDMARKS])
+        if side == RIGHT:
+            self.landmarks *= -1.0
+
+# ==================================== #
+
+    def predict(self, rotation=0.0):
+        """Move all particles by the rotation measured by the gyroscope
+        during the last cycle (degree) plus motion noise"""
+
+        self.particles[:, 2] += rotation
+        self.rng.standard_normal(out=self.noise)
+        self.noise           *= self.motionNoise
+        self.particles       += self.noise
+
+# ==================================== #
+
+    def update(self, visible, polar, headYaw=0.0):
+        """Weight the particles by the landmark observations of this cycle.
+        visible     boolean mask of seen landmarks in the order of vision.LANDMARKS
+        polar       polar coordinates of the landmarks as seen by the camera
+        headYaw     current angle of the neck joint in degree"""
+
+        if not np.any(visible):
+            return
+
+        landmarks = self.landmarks[visible]
+        polar     = polar[visible]
+
+        # observed horizontal distance and bearing relative to the torso
+        distance  = polar[:, 0] * np.cos(np.radians(polar[:, 2]))
+        bearing   = polar[:, 1] + headYaw
+
+        # expected distance and bearing for every particle and landmark
+        dx = landmarks[:, 0] - self.particles[:, 0, None]
+        dy = landmarks[:, 1] - self.particles[:, 1, None]
+        expDistance = np.hypot(dx, dy)
+        expBearing  = np.degrees(np.arctan2(dy, dx)) - self.particles[:, 2, None]
+
+        distanceError = (distance - expDistance) / (self.distanceNoise * distance + 1e-3)
+        bearingError  = wrap_angle(bearing - expBearing) / self.bearingNoise
+
+        logLikelihood  = -0.5 * np.sum(distanceError**2 + bearingError**2, axis=1)
+        logLikelihood -= logLikelihood.max()
+
+        self.weights *= np.exp(logLikelihood)
+        self.weights /= self.weights.sum()
+
+        # resample once the effective number of particles gets too low
+        if 1.0 / np.sum(self.weights**2) < self.nparticles / 2.0:
+            self.resample()
+
+# ==================================== #
+
+    def resample(self):
+        """Systematic resampling"""
+
+        positions = (self.rng.random() + np.arange(self.nparticles)) / self.nparticles
+        indices   = np.searchsorted(np.cumsum(self.weights), positions)
+        np.minimum(indices, self.nparticles-1, out=indices)
+
+        self.particles[:] = self.particles[indices]
+        self.weights[:]   = 1.0/self.nparticles
+
+# ==================================== #
+
+    def estimate(self):
+        """Weighted mean pose (x, y, theta) of all particles"""
+
+        self.pose[0] = np.dot(self.weights, self.particles[:, 0])
+        self.pose[1] = np.dot(self.weights, self.particles[:, 1])
+
+        theta        = np.radians(self.particles[:, 2])
+        self.pose[2] = np.degrees(np.arctan2(np.dot(self.weights, np.sin(theta)),
+                                             np.dot(self.weights, np.cos(theta))))
+
+        return self.pose
+
+# ==================================== #
+
+    def get_pose(self):
+        return self.pose
+
+
+# ============================================================================ #
+
+#####################
+# UTILITY FUNCTIONS #
+#####################
+
+def wrap_angle(angle):
+    """Wrap angles in degree to the interval [-180, 180)"""
+    return (angle + 180.0) % 360.0 - 180.0
+
+# ==================================== #
+
+def local2global(pose, point, headYaw=0.0):
+    """Transform points seen by the camera into global field coordinates,
+    given the robot pose (x, y, theta) and the neck joint angle in degree.
+    point may be a single point or an array of points.
+    Only x and y are transformed, z is kept."""
+
+    angle  = math.radians(pose[2] + headYaw)
+    sin    = math.sin(angle)
+    cos    = math.cos(angle)
+    point  = np.asarray(point, dtype=float)
+    result = np.empty(point.shape)
+
+    result[..., 0] = pose[0] + cos*point[..., 0] - sin*point[..., 1]
+    result[..., 1] = pose[1] + sin*point[..., 0] + cos*point[..., 1]
+    result[..., 2] = point[..., 2]
+
+    return result
@@ -0,0 +1,200 @@
+#! /usr/bin/env python3
+
+
+import gc
+import sys
+import tracemalloc
+
+# ============================================================================ #
+
+# stages of NaoRobot.step() as (name, owner attribute path, method name)
+# None as path means the robot itself
+STAGES = (('step',        None,         'step'),
+          ('receive',     'pns',        'receive_messages'),
+          ('perceive',    None,         'perceive'),
+          ('reflexes',    'reflexes',   'check'),
+          ('behaviour',   'behaviour',  'tick'),
+          ('msched',      'msched',     'run'),
+          ('control',     None,         'control'),
+          ('communicate', None,         'communicate'),
+          ('flush',       'pns',        'flush_effectors'))
+
+# ============================================================================ #
+
+class AllocationProfiler(object):
+    """Count the memory allocated in every stage of a robot's cycle
+    attach() wraps the methods that make up a cycle, see STAGES, so that
+    every call is measured with tracemalloc:
+        peak    the most memory allocated at once during the call, i.e.
+                including everything that was freed again before returning
+        net     the memory still allocated after the call
+        blocks  the number of memory blocks (objects, buffers) still
+                allocated after the call
+    Nested stages, e.g. perceive inside step, are included in the outer one.
+    The bookkeeping of the profiler itself is measured once in attach()
+    and subtracted. Allocations of other threads, e.g. of other robots
+    in the same process, are counted as well.
+    Tracing slows the robot down considerably, use it to find allocations,
+    not to measure timing. It is stopped once the last profiler of the
+    process is detached."""
+
+    attached = 0 # profilers of the process that are attached
+
+    def __init__(self, robot, frames=1):
+        self.robot   = robot
+        self.frames  = frames
+        self.stats   = {}   # stage name -> [calls, peak, net, blocks]
+        self.stack   = []   # [start memory, start blocks, peak] of open stages
+        self.wrapped = []   # (owner, method name)
+        self.overhead = (0, 0, 0) # peak, net, blocks of an empty stage
+
+# ==================================== #
+
+    def attach(self):
+        """Start tracing and wrap the stage methods of the robot"""
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        AllocationProfiler.attached += 1
+
+        # measure the bookkeeping alone
+        calibration = self._wrap('calibration', lambda: None)
+        self.stats['calibration'] = [0, 0, 0, 0]
+        for i in range(100):
+            calibration()
+        calls, peak, net, blocks = self.stats.pop('calibration')
+        self.overhead = (peak / calls, net / calls, blocks / calls)
+
+        for name, path, method in STAGES:
+            owner = self.robot if path is None else getattr(self.robot, path)
+            if owner is None:
+                continue
+            setattr(owner, method, self._wrap(name, getattr(owner, method)))
+            self.wrapped.append((owner, method))
+            self.stats.setdefault(name, [0, 0, 0, 0])
+
+# ==================================== #
+
+    def detach(self):
+        """Restore the original methods and stop tracing,
+        unless other profilers are still attached"""
+
+        for owner, method in self.wrapped:
+            delattr(owner, method)
+        self.wrapped = []
+        AllocationProfiler.attached -= 1
+        if AllocationProfiler.attached == 0:
+            tracemalloc.stop()
+
+# ==================================== #
+
+    def _wrap(self, name, function):
+        """Wrap function so that its calls are measured as stage name"""
+
+        def measured(*args, **kwargs):
+            self._enter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self._exit(name)
+
+        return measured
+
+    def _enter(self):
+        current, peak = tracemalloc.get_traced_memory()
+        if self.stack:
+            # keep the peak of the outer stage before resetting it
+            outer = self.stack[-1]
+            outer[2] = max(outer[2], peak)
+        tracemalloc.reset_peak()
+        self.stack.append([current, sys.getallocatedblocks(), current])
+
+    def _exit(self, name):
+        current, peak = tracemalloc.get_traced_memory()
+        blocks = sys.getallocatedblocks()
+        start, startBlocks, startPeak = self.stack.pop()
+        peak = max(peak, startPeak)
+
+        stats     = self.stats[name]
+        stats[0] += 1
+        stats[1] += peak - start
+        stats[2] += current - start
+        stats[3] += blocks - startBlocks
+
+        if self.stack:
+            outer = self.stack[-1]
+            outer[2] = max(outer[2], peak)
+
+# ==================================== #
+
+    def reset(self):
+        """Forget everything measured so far"""
+        for stats in self.stats.values():
+            stats[:] = [0, 0, 0, 0]
+
+# ==================================== #
+
+    def __str__(self):
+        string = "{:<12} {:>8} {:>12} {:>12} {:>12}\n".format(
+                'stage', 'calls', 'peak B/call', 'net B/call', 'blocks/call')
+        for name, path, method in STAGES:
+            if name not in self.stats:
+                continue
+            calls, peak, net, blocks = self.stats[name]
+            n = max(calls, 1)
+            string += "{:<12} {:>8} {:>12.0f} {:>12.1f} {:>12.2f}\n".format(name, calls,
+                    peak/n - self.overhead[0], net/n - self.overhead[1], blocks/n - self.overhead[2])
+        return string[:-1]
+
+
+# ============================================================================ #
+
+
+class IdleCollector(object):
+    """Keep the cyclic garbage collector out of the control loop
+    start() freezes all objects created so far, i.e. the robots and their
+    tables, so that the collector never scans them again, and disables
+    automatic collection. The robots call idle() after every step, while
+    they wait for the next perceptor message, and only then the collector
+    runs, for the oldest generation whose threshold was exceeded, just as
+    it would have run automatically.
+    The collector is global to the process, so one IdleCollector serves
+    all robots of a process."""
+
+    def __init__(self, freeze=True):
+        self.freeze      = freeze
+        self.collections = [0, 0, 0]
+        self.running     = False
+
+# ==================================== #
+
+    def start(self):
+        if self.freeze:
+            gc.collect()
+            gc.freeze()
+        gc.disable()
+        self.running = True
+
+    def stop(self):
+        gc.enable()
+        if self.freeze:
+            gc.unfreeze()
+        self.running = False
+
+# ==================================== #
+
+    def idle(self):
+        """Collect now, if the collector would have run in the meantime
+        Return the number of unreachable objects found."""
+
+        if not self.running:
+            return 0
+
+        count     = gc.get_count()
+        threshold = gc.get_threshold()
+        for generation in (2, 1, 0):
+            if threshold[generation] > 0 and count[generation] > threshold[generation]:
+                self.collections[generation] += 1
+                return gc.collect(generation)
+
+        return 0
@@ -0,0 +1,212 @@
+#! /usr/bin/env python3
+
+
+import math
+
+# ============================================================================ #
+
+# Constants
+GRAVITY = 9.81 # m/s^2
+
+# postures
+UPRIGHT = 'upright'
+FRONT   = 'front'   # lying on the belly
+BACK    = 'back'    # lying on the back
+SIDE    = 'side'
+
+# get-up motions as keyframes ({hinge joint: angle in degree}, maximum cycles)
+# a keyframe ends once all its joints reached their angles or after
+# the given number of cycles, whatever comes first
+GETUP_FROM_FRONT = (({'raj1': -90.0, 'laj1': -90.0, 'raj2':   0.0, 'laj2':   0.0,
+                      'raj4':   0.0, 'laj4':   0.0}, 25),
+                    ({'rlj3':  90.0, 'llj3':  90.0, 'rlj4': -120.0, 'llj4': -120.0}, 30),
+                    ({'raj1':   0.0, 'laj1':   0.0, 'rlj5':  60.0, 'llj5':  60.0}, 25),
+                    ({'raj1':  90.0, 'laj1':  90.0}, 20),
+                    ({'rlj3':  30.0, 'llj3':  30.0, 'rlj4':  -60.0, 'llj4':  -60.0,
+                      'rlj5':  30.0, 'llj5':  30.0}, 30),
+                    ({'raj1': -90.0, 'laj1': -90.0, 'rlj3':   0.0, 'llj3':   0.0,
+                      'rlj4':   0.0, 'llj4':   0.0, 'rlj5':   0.0, 'llj5':   0.0}, 40))
+
+GETUP_FROM_BACK  = (({'raj1':  90.0, 'laj1':  90.0, 'raj2':   0.0, 'laj2':   0.0}, 25),
+                    ({'raj1': 110.0, 'laj1': 110.0, 'rlj3':  90.0, 'llj3':  90.0}, 30),
+                    ({'rlj3': 100.0, 'llj3': 100.0, 'rlj4': -120.0, 'llj4': -120.0,
+                      'raj1':  60.0, 'laj1':  60.0}, 25),
+                    ({'rlj5':  60.0, 'llj5':  60.0, 'raj1':   0.0, 'laj1':   0.0}, 30),
+                    ({'rlj3':  30.0, 'llj3':  30.0, 'rlj4':  -60.0, 'llj4':  -60.0,
+                      'rlj5':  30.0, 'llj5':  30.0}, 30),
+                    ({'raj1': -90.0, 'laj1': -90.0, 'rlj3':   0.0, 'llj3':   0.0,
+                      'rlj4':   0.0, 'llj4':   0.0, 'rlj5':   0.0, 'llj5':   0.0}, 40))
+
+# ============================================================================ #
+
+class FallDetector(object):
+    """Decide from the torso sensors whether the robot is falling or lying
+    The accelerometer measures the reaction to gravity, i.e. the global up
+    direction in the torso frame as long as the robot is not accelerated much.
+    If the robot tilts more than threshold degree from upright for
+    confirmCycles consecutive cycles, it counts as fallen. While the
+    measured acceleration is far from 1g (free fall, impact) the orientation
+    integrated by the gyroscope is used instead.
+    Every check only reads a few scalars, it costs the same every cycle."""
+
+    def __init__(self, threshold=60.0, confirmCycles=2):
+        self.cosThreshold  = math.cos(math.radians(threshold))
+        self.confirmCycles = confirmCycles
+        self.tiltedCycles  = 0
+        self.posture       = UPRIGHT
+
+# ==================================== #
+
+    def update(self, acc, gyr):
+        """Update with the Accelerometer and Gyroscope of this cycle
+        Return the posture, UPRIGHT until a fall is confirmed"""
+
+        # Accelerometer.set() subtracts 1g from z, add it back
+        a = acc.acceleration
+        x, y, z = a[0], a[1], a[2] + GRAVITY
+        norm = math.sqrt(x*x + y*y + z*z)
+
+        if 0.5*GRAVITY < norm < 1.5*GRAVITY:
+            cosTilt = z / norm
+        else:
+            # global z in the torso frame, from the integrated rates
+            x, y, z = gyr.x[2], gyr.y[2], gyr.z[2]
+            cosTilt = z
+
+        if cosTilt < self.cosThreshold:
+            self.tiltedCycles += 1
+        else:
+            self.tiltedCycles = 0
+
+        if self.tiltedCycles < self.confirmCycles:
+            self.posture = UPRIGHT
+        elif abs(x) >= abs(y):
+            # torso x points forward, towards the ground when on the belly
+            self.posture = FRONT if x < 0 else BACK
+        else:
+            self.posture = SIDE
+
+        return self.posture
+
+# ==================================== #
+
+    def reset(self):
+        self.tiltedCycles = 0
+        self.posture      = UPRIGHT
+
+
+# ============================================================================ #
+
+
+class Motion(object):
+    """Keyframe motion for the MovementScheduler
+    The keyframes are compiled once into tuples of (hinge joint, angle),
+    so stepping only walks the current frame. step() moves the joints of the
+    current keyframe with move_hj_to() and returns "done" after the last."""
+
+    def __init__(self, robot, keyframes, speed=100):
+        self.robot  = robot
+        self.speed  = speed
+        self.frames = tuple((tuple((hj, float(angle)) for hj, angle in sorted(frame.items())
+                                   if hj in robot.hj), cycles)
+                            for frame, cycles in keyframes)
+        self.reset()
+
+# ==================================== #
+
+    def reset(self):
+        self.frame  = 0
+        self.cycles = 0
+
+# ==================================== #
+
+    def step(self):
+        """Run one cycle of the motion"""
+
+        joints, maxCycles = self.frames[self.frame]
+
+        done = True
+        for hj, angle in joints:
+            if self.robot.move_hj_to(hj, angle=angle, speed=self.speed) != "done":
+                done = False
+
+        self.cycles += 1
+        if done or self.cycles >= maxCycles:
+            self.frame  += 1
+            self.cycles  = 0
+            if self.frame == len(self.frames):
+                self.reset()
+                return "done"
+
+        return "not done"
+
+
+# ============================================================================ #
+
+
+class Reflexes(object):
+    """Fall detection and get-up reflex
+    check() runs every cycle before the behaviour and the scheduled
+    movements. Once a fall is detected, all joints are stopped, every other
+    scheduled movement is dropped and the get-up motion for the posture is
+    put in front of the MovementScheduler. While the robot gets up,
+    NaoRobot.step() does not tick the behaviour, and movements scheduled
+    from elsewhere are dropped before they run."""
+
+    def __init__(self, robot, threshold=60.0, confirmCycles=2):
+        self.robot    = robot
+        self.detector = FallDetector(threshold, confirmCycles)
+        self.motions  = {FRONT: Motion(robot, GETUP_FROM_FRONT),
+                         BACK:  Motion(robot, GETUP_FROM_BACK),
+                         SIDE:  Motion(robot, GETUP_FROM_BACK)}
+        self.active   = None # motion running at the moment
+        self.done     = [True]
+        self.falls    = 0
+
+# ==================================== #
+
+    def check(self):
+        """Detect falls and start getting up"""
+
+        robot   = self.robot
+        posture = self.detector.update(robot.acc, robot.gyr)
+
+        if self.active is not None:
+            if not self.done[0]:
+                for item in robot.msched.flush(keep=self.active.step):
+                    if 'hj' in item[1]:
+                        self.release(item[1]['hj'])
+                return
+            self.active = None
+
+        if posture == UPRIGHT:
+            return
+
+        self.falls += 1
+        if robot.debugLevel > 0:
+            print("Robot {} fell on its {}, getting up".format(robot.agentID, posture))
+
+        # stop everything that is moving
+        robot.msched.flush()
+        robot.controller.stop()
+        for he, rate in robot.he.items():
+            if rate != 0.0:
+                robot.pns.hinge_joint_effector(he, 0.0)
+                robot.he[he] = 0.0
+
+        self.active = self.motions[posture]
+        self.active.reset()
+        self.done   = [False]
+        robot.msched.appendleft([self.active.step, {}, self.done])
+
+# ==================================== #
+
+    def release(self, hj):
+        """Stop a joint that a dropped movement was moving"""
+        self.robot.release_hj(hj)
+
+# ==================================== #
+
+    def is_active(self):
+        """True while the robot is getting up"""
+        return self.active is not None
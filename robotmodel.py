@@ -0,0 +1,160 @@
+#! /usr/bin/env python3
+
+
+import os, json
+import numpy as np
+
+# ============================================================================ #
+
+# Constants
+MODELDIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+
+# ============================================================================ #
+
+class RobotModel(object):
+    """Robot model compiled from a descriptor file in models/
+    The descriptor lists the hinge joints with perceptor name, effector name
+    and angle limits in degree, the scene file to request from the server,
+    the maximum joint speed in degree/cycle and the maximum change of the
+    joint speed in degree/cycle^2. Player types of the heterogeneous robots
+    may replace the scene, the maximum speed and acceleration, and
+    add or override joints by perceptor name.
+    The maximum acceleration is not a limit of the server, which applies a
+    new speed at once. It bounds how fast the JointController changes the
+    speed, so that sudden speed changes do not upset the robot's balance.
+    The 3.5 degree/cycle^2 of the Nao are assumed, not measured: half of
+    the maximum speed, i.e. full speed after two cycles.
+    Compiling assigns every joint an index. All per joint tables are numpy
+    arrays in index order and shared by all robots of the same type."""
+
+    def __init__(self, descriptor, playerType=None):
+        self.name       = descriptor['name']
+        self.playerType = playerType
+        self.scene      = descriptor['scene']
+        self.maxhjSpeed = descriptor['maxhjSpeed']
+        self.maxhjAcceleration = descriptor['maxhjAcceleration']
+
+        joints = [dict(joint) for joint in descriptor['joints']]
+
+        if playerType is not None:
+            variant = descriptor['types'][str(playerType)]
+            self.scene      = variant.get('scene',      self.scene)
+            self.maxhjSpeed = variant.get('maxhjSpeed', self.maxhjSpeed)
+            self.maxhjAcceleration = variant.get('maxhjAcceleration', self.maxhjAcceleration)
+            byName = {joint['perceptor']: joint for joint in joints}
+            for joint in variant.get('joints', []):
+                if joint['perceptor'] in byName:
+                    byName[joint['perceptor']].update(joint)
+                else:
+                    joints.append(dict(joint))
+
+        # names and indices
+        self.perceptors  = tuple(joint['perceptor'] for joint in joints)
+        self.effectors   = tuple(joint['effector']  for joint in joints)
+        self.index       = {name: i for i, name in enumerate(self.perceptors)}
+        self.effectorIndex = {name: i for i, name in enumerate(self.effectors)}
+        self.effectorOf  = dict(zip(self.perceptors, self.effectors))
+
+        # per joint tables in index order
+        self.hjMin    = np.array([joint['min'] for joint in joints], dtype=float)
+        self.hjMax    = np.array([joint['max'] for joint in joints], dtype=float)
+        self.maxSpeed = np.array([joint.get('maxSpeed', self.maxhjSpeed) for joint in joints],
+                dtype=float)
+        self.maxAcceleration = np.array([joint.get('maxAcceleration', self.maxhjAcceleration)
+                for joint in joints], dtype=float)
+
+        for table in (self.hjMin, self.hjMax, self.maxSpeed, self.maxAcceleration):
+            table.flags.writeable = False
+
+# ==================================== #
+
+    def joint_array(self, values=None):
+        """New JointArray indexed by hinge joint perceptor names"""
+        return JointArray(self.index, values)
+
+    def effector_array(self, values=None):
+        """New JointArray indexed by hinge joint effector names"""
+        return JointArray(self.effectorIndex, values)
+
+# ==================================== #
+
+    def __len__(self):
+        return len(self.perceptors)
+
+
+# ============================================================================ #
+
+
+class JointArray(object):
+    """Per joint values stored in one numpy array in model index order
+    Behaves like a dictionary keyed by joint name, while vectorized code
+    can work on the values array directly."""
+
+    def __init__(self, index, values=None):
+        self.index = index
+        if values is None:
+            self.values = np.zeros(len(index))
+        else:
+            self.values = values
+
+# ==================================== #
+
+    def __getitem__(self, name):
+        return self.values[self.index[name]]
+
+    def __setitem__(self, name, value):
+        self.values[self.index[name]] = value
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    def keys(self):
+        return self.index.keys()
+
+    def items(self):
+        return zip(self.index.keys(), self.values.tolist())
+
+# ==================================== #
+
+    def copy(self):
+        """Copy of the values, sharing the index"""
+        return JointArray(self.index, self.values.copy())
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+# ==================================== #
+
+    def __str__(self):
+        return str(dict(self.items()))
+
+
+# ============================================================================ #
+
+#####################
+# UTILITY FUNCTIONS #
+#####################
+
+# descriptors and compiled models, parsed once per process
+_descriptors = {}
+_models      = {}
+
+def load_model(name='nao', playerType=None):
+    """Return the RobotModel described in models/<name>.json for the given
+    player type (None for the standard robot).
+    Each descriptor is parsed and each type compiled only once per process."""
+
+    key = (name, playerType)
+    if key not in _models:
+        if name not in _descriptors:
+            with open(os.path.join(MODELDIR, name + '.json')) as modelFile:
+                _descriptors[name] = json.load(modelFile)
+        _models[key] = RobotModel(_descriptors[name], playerType)
+
+    return _models[key]
@@ -1,16 +1,29 @@
 #! /usr/bin/env python3
 
 
-import sys, time, math
+import sys, time, math, copy
 import threading
-import socket, struct
-import numpy as np
+import socket, struct, select
 from collections import deque
 
+from buffers import DoubleBuffer
+from teamcomm import TeamComm, TeamMessage
+from lazy import lazy_import
+from reflex import Reflexes
+
+# heavy modules are only imported on first use
+np           = lazy_import('numpy')
+robotmodel   = lazy_import('robotmodel')
+controller   = lazy_import('controller')
+vision       = lazy_import('vision')
+localization = lazy_import('localization')
+profiling    = lazy_import('profiling')
+
 # ============================================================================ #
 
 # Constants
 CYCLE_LENGTH = 0.02 # cycle length in seconds
+FLUSHED      = 'flushed' # done flag of movements removed by MovementScheduler.flush()
 
 # ============================================================================ #
 
@@ -20,9 +33,25 @@ class PNS(object):
     Sends effector messages.
     Receives perceptor messages.
     Upon creation the agent is registered with the server.
+    Effector messages are collected during a cycle and sent as one frame
+    by flush_effectors(). If the kernel send buffer is full, the frame is
+    not sent but merged with the next one, so that only the latest command
+    of every effector goes out once the server catches up.
+    If the server does not send anything for timeout seconds, ServerTimeout
+    is raised, if it closes the connection, ConnectionClosed.
+    With sync=True every frame ends with (syn) and a frame is sent every
+    cycle, for servers that wait for all agents before the next cycle.
+    A transport, e.g. a faultinjection.Scenario, is called with every new
+    connection and returns the object that is used in place of the socket.
+    If it reads from a different descriptor than it writes to, it provides
+    send_fileno() for the write side.
+    attempts is a list whose zeroth element counts the connection attempts,
+    the caller can pass its own to read them even if connecting fails.
     """
     def __init__(self, agentID, teamname, host='localhost', port=3100,
-            model='rsg/agent/nao/nao.rsg', debugLevel=10):
+            model='rsg/agent/nao/nao.rsg', debugLevel=10,
+            connectRetries=10, connectBackoff=0.05, maxBackoff=2.0, timeout=1.0,
+            sync=False, transport=None, attempts=None):
 
         self.agentID    = agentID
         self.teamname   = teamname
@@ -31,16 +60,85 @@ class PNS(object):
         self.model      = model
         self.debugLevel = debugLevel
 
-        # create socket and connect to simulation server
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.connect((self.host, self.port))
+        self.connectRetries  = connectRetries
+        self.connectBackoff  = connectBackoff
+        self.maxBackoff      = maxBackoff
+        self.attempts        = [0] if attempts is None else attempts
+        self.timeout         = timeout
+        self.sync            = sync
+        self.transport       = transport
+
+        # effector messages of the current frame by effector name
+        self.effectors     = {}
+        self.droppedFrames = 0
+
+        # received bytes that do not form a complete message yet
+        self.rbuffer       = bytearray()
+        # what the socket delivered last, reused for every read
+        self.chunk         = bytearray(65536)
+
+        # connect to the simulation server, create and initialize the agent
+        self.connect()
 
-        # create and initialize agent
+# ==================================== #
+
+    @property
+    def connectAttempts(self):
+        """Number of connection attempts so far"""
+        return self.attempts[0]
+
+# ==================================== #
+
+    def handshake(self):
+        """Create the agent in the simulation and register it with its team"""
         self._send_effector('(scene {})'.format(self.model))
         self.receive_perceptors()
         self._send_effector('(init (unum {})(teamname {}))'.format(self.agentID, self.teamname))
         self.receive_perceptors() 
 
+# ==================================== #
+
+    def reconnect(self):
+        """Replace a broken connection by a new one and register
+        the agent again. Pending effector messages are discarded."""
+
+        try:
+            self.socket.close()
+        except OSError:
+            pass
+
+        self.effectors.clear()
+        self.connect()
+
+# ==================================== #
+
+    def connect(self):
+        """Connect to the simulation server and register the agent.
+        If the server is not up yet or does not complete the handshake
+        within timeout, retry with exponential backoff
+        until connectRetries retries have failed."""
+
+        backoff = self.connectBackoff
+        for attempt in range(self.connectRetries + 1):
+            self.attempts[0] += 1
+            del self.rbuffer[:]
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket.settimeout(self.timeout)
+            try:
+                self.socket.connect((self.host, self.port))
+                if self.transport is not None:
+                    self.socket = self.transport(self.socket)
+                self.handshake()
+                return
+            except OSError:
+                self.socket.close()
+                if attempt == self.connectRetries:
+                    raise
+                if self.debugLevel >= 10:
+                    print("Agent {} could not connect, retrying in {:.2f} sec.".format(self.agentID, backoff))
+                time.sleep(backoff)
+                backoff = min(2*backoff, self.maxBackoff)
+
 # ==================================== #
 
     def _send_effector(self, message):
@@ -52,49 +150,145 @@ class PNS(object):
             print("S:", message)
 
         # convert message to ASCII encoded byte string
-        length   = len(message)
-        bmessage = bytes(message, 'ASCII')
-
-        # send length of message
-        lengthMessage = struct.pack("!I", length)
+        # and send it together with its length, in one segment where possible,
+        # so the payload is not held back by Nagle's algorithm
+        bmessage = struct.pack("!I", len(message)) + bytes(message, 'ASCII')
         bytesSent = 0
-        while (bytesSent < 4):
-            bytesSent += self.socket.send(lengthMessage[bytesSent:])
-
-        # send actual message
-        bytesSent = 0
-        while (bytesSent < length):
+        while (bytesSent < len(bmessage)):
             bytesSent += self.socket.send(bmessage[bytesSent:])
 
+# ==================================== #
+
+    def send_fileno(self):
+        """File descriptor the effector messages are written to,
+        the server socket itself even if a transport wraps it"""
+        if hasattr(self.socket, 'send_fileno'):
+            return self.socket.send_fileno()
+        return self.socket.fileno()
+
+# ==================================== #
+
+    def _queue_effector(self, name, message):
+        """Add an effector message to the current frame,
+        replacing any earlier message to the same effector"""
+        self.effectors[name] = message
+
+# ==================================== #
+
+    def flush_effectors(self):
+        """Send all effector messages of the current frame as one message.
+        If the kernel send buffer has no room, the frame is kept and merged
+        with the next one instead of blocking the control loop.
+        Return True if the frame was sent."""
+
+        if self.sync:
+            # keep (syn) at the end of the frame
+            self.effectors.pop('syn', None)
+            self.effectors['syn'] = '(syn)'
+
+        if len(self.effectors) == 0:
+            return True
+
+        writable = select.select([], [self.send_fileno()], [], 0)[1]
+        if not writable:
+            self.droppedFrames += 1
+            if self.debugLevel >= 10:
+                print("Agent {}: send buffer full, delaying effector frame".format(self.agentID))
+            return False
+
+        self._send_effector(''.join(self.effectors.values()))
+        self.effectors.clear()
+        return True
+
 # ==================================== #
 
     def receive_perceptors(self):
+        """Block until the next perceptor message arrived and return it parsed"""
+        return self._parse_perceptors(self.receive_message())
 
-        # receive length of the message (4 bytes)
-        length = self._receive_message(4)
-        length = struct.unpack("!I", length)[0]
+# ==================================== #
 
-        # receive actual message
-        perceptors = self._receive_message(length)
-        perceptors = str(perceptors, 'ASCII')
+    def receive_message(self):
+        """Block until the next complete perceptor message arrived
+        and return it unparsed"""
+
+        message = self._pop_message()
+        while message is None:
+            self._fill_buffer()
+            message = self._pop_message()
+
+        return message
 
-        return self._parse_perceptors(perceptors)
-    
 # ==================================== #
 
-    def _receive_message(self, length):
-        """Receive a message from server communication socket of given length"""
+    def receive_messages(self, block=True):
+        """Return all complete perceptor messages received so far, unparsed.
+        If block is True, wait until there is at least one. Otherwise
+        read once from the socket, which must be readable then, e.g.
+        because a selector reported so."""
+
+        if block:
+            messages = [self.receive_message()]
+        else:
+            self._fill_buffer()
+            messages = []
+
+        message = self._pop_message()
+        while message is not None:
+            messages.append(message)
+            message = self._pop_message()
+
+        return messages
+
+# ==================================== #
+
+    def _fill_buffer(self):
+        """Append whatever the socket has to offer to the receive buffer.
+        Blocks until at least one byte is available."""
+
+        try:
+            nbytes = self.socket.recv_into(self.chunk)
+        except socket.timeout:
+            raise ServerTimeout('No message from simulation server for {} sec.'.format(self.timeout))
+        if (nbytes == 0):
+            raise ConnectionClosed('Socket to simulation server was closed')
+
+        with memoryview(self.chunk) as view:
+            self.rbuffer += view[:nbytes]
+
+# ==================================== #
+
+    def _pop_message(self):
+        """Remove the first complete message from the receive buffer and
+        return it as string. Each message is prefixed with its length
+        as 32 bit unsigned integer in network order.
+        Return None if no complete message has been received yet."""
+
+        if len(self.rbuffer) < 4:
+            return None
+        length = struct.unpack_from("!I", self.rbuffer)[0]
+        if len(self.rbuffer) < 4 + length:
+            return None
+
+        # decode straight from the buffer, without copying the bytes first
+        with memoryview(self.rbuffer) as view:
+            message = str(view[4:4+length], 'ASCII')
+        del self.rbuffer[:4+length]
 
-        message = b''
-        while (len(message) < length):
-            nextBytes = self.socket.recv(length - len(message))
-            if (nextBytes == ''):
-                raise OSError('Socket to simulation server was closed')
-            else:
-                message += nextBytes
- 
         return message
 
+# ==================================== #
+
+    def parse_perceptors(self, message):
+        """Parse a message returned by receive_message(s)"""
+        return self._parse_perceptors(message)
+
+# ==================================== #
+
+    def fileno(self):
+        """File descriptor of the server socket, for use with selectors"""
+        return self.socket.fileno()
+
 # ==================================== #
 
     def _parse_perceptors(self, perceptors):
@@ -174,7 +368,7 @@ class PNS(object):
         """Set the change rate in degree/cycle of the
         hinge joint with the provided name"""
         message = "({} {:.2f})".format(name, rate)
-        self._send_effector(message)
+        self._queue_effector(name, message)
 
 # ==================================== #
 
@@ -182,7 +376,7 @@ class PNS(object):
         """Set the change rate in degree/cycle of axis 1 and 2 of the
         hinge joint with the provided name"""
         message = "({} {:.2f} {:.2f})".format(name, rate1, rate2)
-        self._send_effector(message)
+        self._queue_effector(name, message)
 
 # ==================================== #
 
@@ -194,7 +388,7 @@ class PNS(object):
         x, y        Coordinates
         rotation    horizontal orientation with respect to x-axis in degree"""
         message = "(beam {:.2f} {:.2f} {:.2f})".format(x, y, rotation)
-        self._send_effector(message)
+        self._queue_effector('beam', message)
 
 # ==================================== #
 
@@ -210,7 +404,7 @@ class PNS(object):
                 print("Nothing sent.")
                 return
         message = "(say {})".format(message)
-        self._send_effector(message)
+        self._queue_effector('say', message)
  
 
 # ============================================================================ #
@@ -227,7 +421,25 @@ class MovementScheduler(deque):
         that contains the keyword arguments passed to the function. The third
         item is optional and should contain a list (as the  simplest mutable datatype)
         whose zeroth element is set to true once the function contains 'done'
-        to signal completion."""
+        to signal completion, or to FLUSHED if the item was removed by flush()."""
+        self._check(newitem)
+        super().append(newitem) 
+
+# ==================================== #
+
+    def appendleft(self, newitem):
+        """Schedule newitem with top priority, i.e. it is executed first
+        in every cycle. The format is the same as for append()."""
+        self._check(newitem)
+        super().appendleft(newitem) 
+
+# ==================================== #
+
+    def _check(self, newitem):
+        """Raise QueueItemError if newitem has the wrong format and
+        SchedulerConflict if it would operate on a hinge joint
+        that is already in use"""
+
         # check proper format of item first
         if not type(newitem) == list:
             raise QueueItemError("MovementQueue items must be lists.")
@@ -253,8 +465,6 @@ class MovementScheduler(deque):
                 except KeyError:
                     pass
 
-        super().append(newitem) 
-
 # ==================================== #
 
     def run(self):
@@ -273,6 +483,40 @@ class MovementScheduler(deque):
             elif len(item) == 3:
                 item[2][0] = True
 
+# ==================================== #
+
+    def flush(self, keep=None):
+        """Remove all scheduled items except those of function keep
+        The done flag of every removed item is set to FLUSHED, so whoever
+        waits for it learns that the movement will not complete.
+        Return the removed items."""
+
+        removed = [item for item in self if item[0] != keep]
+        kept    = [item for item in self if item[0] == keep]
+        self.clear()
+        self.extend(kept)
+
+        for item in removed:
+            if len(item) == 3:
+                item[2][0] = FLUSHED
+
+        return removed
+
+# ==================================== #
+
+    def cancel(self, item):
+        """Remove item, the very list that was scheduled, if it is still queued
+        Its done flag is set to FLUSHED. Return True if it was removed."""
+
+        for i, scheduled in enumerate(self):
+            if scheduled is item:
+                del self[i]
+                if len(item) == 3:
+                    item[2][0] = FLUSHED
+                return True
+
+        return False
+
 
 # ============================================================================ #
 
@@ -281,12 +525,13 @@ class GameState(object):
     """Store game state information"""
 
     def __init__(self, time=0.0, gametime=0.0, scoreLeft=0, scoreRight=0,
-            playmode='BeforeKickOff'):
+            playmode='BeforeKickOff', side=None):
         self.time       = time
         self.gametime   = gametime
         self.scoreLeft  = scoreLeft
         self.scoreRight = scoreRight
         self.playmode   = playmode
+        self.side       = side # 'left' or 'right' once the server told
 
 # ==================================== #
 
@@ -300,6 +545,8 @@ class GameState(object):
         self.scoreRight = scoreRight
     def set_playmode(self, playmode):
         self.playmode   = playmode 
+    def set_side(self, side):
+        self.side       = side
 
     def get_time(self):
         return self.time
@@ -311,6 +558,8 @@ class GameState(object):
         return self.scoreRight
     def get_playmode(self):
         return self.playmode
+    def get_side(self):
+        return self.side
 
 # ==================================== #
     
@@ -320,7 +569,8 @@ class GameState(object):
         string += "gametime   = {}\n".format(self.gametime  )
         string += "scoreLeft  = {}\n".format(self.scoreLeft )
         string += "scoreRight = {}\n".format(self.scoreRight)
-        string += "playmode   = {}"  .format(self.playmode  )
+        string += "playmode   = {}\n".format(self.playmode  )
+        string += "side       = {}"  .format(self.side      )
         return string
 
 
@@ -334,7 +584,7 @@ class Gyroscope(object):
 
     def __init__(self, name):
         self.name = name
-        self.rate = np.zeros(3, dtype=np.float)
+        self.rate = np.zeros(3, dtype=float)
 
         # unit vectors of body with respect to global coordinate system
         self.x = np.array([1.0, 0.0, 0.0])
@@ -348,10 +598,10 @@ class Gyroscope(object):
         # rotation in degree during the last cycle
         rotationAngle = np.linalg.norm(self.rate) / (1.0/CYCLE_LENGTH) 
 
-        # rotate local coordinate frame
-        self.x = rotate_arbitrary(self.rate, self.x, angle=rotationAngle)
-        self.y = rotate_arbitrary(self.rate, self.y, angle=rotationAngle)
-        self.z = rotate_arbitrary(self.rate, self.z, angle=rotationAngle)
+        # rotate local coordinate frame in place
+        rotate_arbitrary(self.rate, self.x, angle=rotationAngle, out=self.x)
+        rotate_arbitrary(self.rate, self.y, angle=rotationAngle, out=self.y)
+        rotate_arbitrary(self.rate, self.z, angle=rotationAngle, out=self.z)
 
     def get_rate(self):
         return self.rate
@@ -369,7 +619,7 @@ class Accelerometer(object):
 
     def __init__(self, name):
         self.name = name
-        self.acceleration = np.zeros(3, dtype=np.float)
+        self.acceleration = np.zeros(3, dtype=float)
 
     def set(self, acceleration):
         for i in range(3):
@@ -390,8 +640,8 @@ class ForceResistanceSensor(object):
 
     def __init__(self, name):
         self.name  = name
-        self.point = np.zeros(3, dtype=np.float)
-        self.force = np.zeros(3, dtype=np.float)
+        self.point = np.zeros(3, dtype=float)
+        self.force = np.zeros(3, dtype=float)
 
     def set(self, point, force):
         """Set the point of origin and the force
@@ -411,11 +661,150 @@ class ForceResistanceSensor(object):
 # ============================================================================ #
 
 
+class CycleStats(object):
+    """Idle accounting of the control loop
+    Per cycle, the time spent waiting for perceptor messages and the time
+    spent processing them are accumulated, to see how much of the cycle
+    length is left as headroom."""
+
+    def __init__(self):
+        self.cycles      = 0 # processed perceptor messages
+        self.skipped     = 0 # skipped perceptor messages
+        self.waitTime    = 0.0
+        self.computeTime = 0.0
+        self.maxCompute  = 0.0
+        self.lastWait    = 0.0
+        self.lastCompute = 0.0
+
+# ==================================== #
+
+    def add(self, wait, compute, cycles=1, skipped=0):
+        self.cycles      += cycles
+        self.skipped     += skipped
+        self.waitTime    += wait
+        self.computeTime += compute
+        self.lastWait     = wait
+        self.lastCompute  = compute
+        if compute > self.maxCompute:
+            self.maxCompute = compute
+
+# ==================================== #
+
+    def get_headroom(self):
+        """Mean fraction of the cycle length not used for computing"""
+        if self.cycles == 0:
+            return 1.0
+        return 1.0 - self.computeTime / (self.cycles * CYCLE_LENGTH)
+
+# ==================================== #
+
+    def __str__(self):
+        string  = "{} cycles, {} of which have been skipped ({:.2f}%),\n\t".format(
+                self.cycles, self.skipped, 100.0*self.skipped/max(self.cycles, 1))
+        string += "waited {:.3f} sec., computed {:.3f} sec. (max {:.2f} ms per cycle), headroom {:.1f}%".format(
+                self.waitTime, self.computeTime, 1000*self.maxCompute, 100.0*self.get_headroom())
+        return string
+
+
+# ============================================================================ #
+
+
+class WorldState(object):
+    """Snapshot of everything the robot perceived during one cycle.
+    NaoRobot keeps two of them in a DoubleBuffer so that threads other than
+    the perception thread can read a consistent state without locking."""
+
+    def __init__(self, model, frpNames=()):
+        self.cycle      = -1
+        self.time       = 0.0
+        self.gametime   = 0.0
+        self.scoreLeft  = 0
+        self.scoreRight = 0
+        self.playmode   = 'BeforeKickOff'
+
+        self.hj         = model.joint_array()
+
+        self.gyrRate    = np.zeros(3)
+        self.gyrX       = np.zeros(3)
+        self.gyrY       = np.zeros(3)
+        self.gyrZ       = np.zeros(3)
+        self.acc        = np.zeros(3)
+
+        self.ballVisible = False
+        self.ball        = np.zeros(3)
+
+        # ball fused by the team world model, confidence 0 without one
+        self.teamBall           = np.zeros(2)
+        self.teamBallConfidence = 0.0
+
+        self.pose        = np.zeros(3)
+
+        self.frpPoint   = {name: np.zeros(3) for name in frpNames}
+        self.frpForce   = {name: np.zeros(3) for name in frpNames}
+
+# ==================================== #
+
+    def update(self, robot, cycle):
+        """Copy the current perception of robot into this buffer.
+        All containers are filled in place, nothing is allocated."""
+
+        self.cycle      = cycle
+        self.time       = robot.gamestate.time
+        self.gametime   = robot.gamestate.gametime
+        self.scoreLeft  = robot.gamestate.scoreLeft
+        self.scoreRight = robot.gamestate.scoreRight
+        self.playmode   = robot.gamestate.playmode
+
+        self.hj.values[:] = robot.hj.values
+
+        self.gyrRate[:] = robot.gyr.rate
+        self.gyrX[:]    = robot.gyr.x
+        self.gyrY[:]    = robot.gyr.y
+        self.gyrZ[:]    = robot.gyr.z
+        self.acc[:]     = robot.acc.acceleration
+
+        # no vision before the first vision perceptor
+        vision = robot._vision
+        if vision is None:
+            self.ballVisible = False
+        else:
+            self.ballVisible = vision.ball_visible()
+            self.ball[:]     = vision.ballPos
+
+        if robot.worldmodel is None:
+            self.teamBallConfidence = 0.0
+        else:
+            self.teamBallConfidence = robot.worldmodel.state.read(self._copy_team_ball)
+
+        self.pose[:]     = robot.get_pose()
+
+        for name, frp in robot.frp.items():
+            self.frpPoint[name][:] = frp.point
+            self.frpForce[name][:] = frp.force
+
+# ==================================== #
+
+    def _copy_team_ball(self, fused):
+        self.teamBall[:] = fused.ball
+        return fused.ballConfidence
+
+# ==================================== #
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+
+# ============================================================================ #
+
+
 class NaoRobot(object):
     """Class that represents the Nao Soccer Robot"""
 
     def __init__(self, agentID, teamname, host='localhost', port=3100, debugLevel=0,
-            startCoordinates=[-0.5, 0, 0]): 
+            startCoordinates=[-0.5, 0, 0], nparticles=200, worldmodel=None,
+            connectRetries=10, connectBackoff=0.05, timeout=1.0, model='nao',
+            playerType=None, autostart=True, sync=False, transport=None, attempts=None,
+            profile=False): 
 
         self.agentID       = agentID
         self.teamname      = teamname
@@ -425,9 +814,32 @@ class NaoRobot(object):
         self.alive         = False
         self.realstarttime = None # starttime of robot
         self.simstarttime  = None 
+        self.reconnects    = 0    # number of times the connection was restored
+        self.birthtime     = time.time()
+
+        # reconnect once the server was silent for this many timeouts in a row,
+        # a single timeout may just be a slow cycle
+        self.maxTimeouts   = 5
+        self.timeouts      = 0
+
+        # catch up with the server once lagging this many cycles behind
+        self.startSkippingNumber = 10
+        self.skipping            = False
+
+        # time spent waiting for and processing perceptor messages
+        self.stats         = CycleStats()
+        self.stepEnd       = None
+
+        # set while no movements are scheduled / notified after every cycle
+        self.idle          = threading.Event()
+        self.newCycle      = threading.Condition()
+
+        # robot model compiled from models/<model>.json, shared by all
+        # robots of the same player type
+        self.model      = robotmodel.load_model(model, playerType)
 
         # set maximum hinge effector speed
-        self.maxhjSpeed = 7.035
+        self.maxhjSpeed = self.model.maxhjSpeed
 
         # movement schedule
         # each sublist should contain a function object and
@@ -443,173 +855,154 @@ class NaoRobot(object):
         self.gyr        = Gyroscope    ('torso')
         self.acc        = Accelerometer('torso')
 
+        # vision and self-localization are created with the first vision
+        # perceptor, until then the pose is the start pose turned by the gyroscope
+        self.nparticles       = nparticles
+        self.startCoordinates = startCoordinates
+        self.initialPose      = np.array(startCoordinates, dtype=float)
+        self._vision          = None
+        self._localization    = None
+
+        # global ball position and cycle in which it was last seen,
+        # older sightings give way to the ball of the team world model
+        self.ballGlobal    = np.zeros(3)
+        self.ballSeenCycle = None
+        self.ballMemory    = 25 # cycles
+
+        # team communication
+        self.role       = 0
+        self.teamcomm   = TeamComm(self.agentID, self.teamname)
+
+        # world model shared with the other agents of the team in this process
+        self.worldmodel = worldmodel
+
+        # behaviour tree ticked every cycle, see behaviour.py
+        self.behaviour  = None
+
+        # runs the garbage collector between cycles, see profiling.IdleCollector
+        self.collector  = None
+
+        # with profile set, the allocations of every stage of step() are
+        # measured while the robot lives, see profiling.AllocationProfiler
+        self.profiler   = profiling.AllocationProfiler(self) if profile else None
+
         # hinge joint perceptor states
-        self.hj         = {'hj1' : 0.0,
-                           'hj2' : 0.0,
-                           'raj1': 0.0,
-                           'raj2': 0.0,
-                           'raj3': 0.0,
-                           'raj4': 0.0,
-                           'laj1': 0.0,
-                           'laj2': 0.0,
-                           'laj3': 0.0,
-                           'laj4': 0.0,
-                           'rlj1': 0.0,
-                           'rlj2': 0.0,
-                           'rlj3': 0.0,
-                           'rlj4': 0.0,
-                           'rlj5': 0.0,
-                           'rlj6': 0.0,
-                           'llj1': 0.0,
-                           'llj2': 0.0,
-                           'llj3': 0.0,
-                           'llj4': 0.0,
-                           'llj5': 0.0,
-                           'llj6': 0.0,}
+        self.hj         = self.model.joint_array()
 
         # corresponding hinge joint effectors
-        self.hjEffector = {'hj1' : 'he1',
-                           'hj2' : 'he2',
-                           'raj1': 'rae1',
-                           'raj2': 'rae2',
-                           'raj3': 'rae3',
-                           'raj4': 'rae4',
-                           'laj1': 'lae1',
-                           'laj2': 'lae2',
-                           'laj3': 'lae3',
-                           'laj4': 'lae4',
-                           'rlj1': 'rle1',
-                           'rlj2': 'rle2',
-                           'rlj3': 'rle3',
-                           'rlj4': 'rle4',
-                           'rlj5': 'rle5',
-                           'rlj6': 'rle6',
-                           'llj1': 'lle1',
-                           'llj2': 'lle2',
-                           'llj3': 'lle3',
-                           'llj4': 'lle4',
-                           'llj5': 'lle5',
-                           'llj6': 'lle6',} 
+        self.hjEffector = self.model.effectorOf
 
         # force resistance perceptors
         self.frp        = {'rf': ForceResistanceSensor('rf'),
                            'lf': ForceResistanceSensor('lf')}
 
+        # double buffered world state for reading from other threads
+        # the perception thread only ever writes to the back buffer
+        self.cycle      = -1
+        self.state      = DoubleBuffer(WorldState(self.model, self.frp),
+                                       WorldState(self.model, self.frp))
+
         # hinge joint effector states
-        self.he         = {'he1' : 0.0,
-                           'he2' : 0.0,
-                           'rae1': 0.0,
-                           'rae2': 0.0,
-                           'rae3': 0.0,
-                           'rae4': 0.0,
-                           'lae1': 0.0,
-                           'lae2': 0.0,
-                           'lae3': 0.0,
-                           'lae4': 0.0,
-                           'rle1': 0.0,
-                           'rle2': 0.0,
-                           'rle3': 0.0,
-                           'rle4': 0.0,
-                           'rle5': 0.0,
-                           'rle6': 0.0,
-                           'lle1': 0.0,
-                           'lle2': 0.0,
-                           'lle3': 0.0,
-                           'lle4': 0.0,
-                           'lle5': 0.0,
-                           'lle6': 0.0,} 
-
-
-        # maxima of hinge joints
-        self.hjMax      = {'hj1' :  120.0,
-                           'hj2' :   45.0,
-                           'raj1':  120.0,
-                           'raj2':    1.0,
-                           'raj3':  120.0,
-                           'raj4':   90.0,
-                           'laj1':  120.0,
-                           'laj2':   95.0,
-                           'laj3':  120.0,
-                           'laj4':    1.0,
-                           'rlj1':    1.0,
-                           'rlj2':   25.0,
-                           'rlj3':  100.0,
-                           'rlj4':    1.0,
-                           'rlj5':   75.0,
-                           'rlj6':   45.0,
-                           'llj1':    1.0,
-                           'llj2':   45.0,
-                           'llj3':  100.0,
-                           'llj4':    1.0,
-                           'llj5':   75.0,
-                           'llj6':   25.0,} 
-
-        # minima of hinge joints
-        self.hjMin      = {'hj1' : -120.0,
-                           'hj2' :  -45.0,
-                           'raj1': -120.0,
-                           'raj2':  -95.0,
-                           'raj3': -120.0,
-                           'raj4':   -1.0,
-                           'laj1': -120.0,
-                           'laj2':   -1.0,
-                           'laj3': -120.0,
-                           'laj4':  -90.0,
-                           'rlj1':  -90.0,
-                           'rlj2':  -45.0,
-                           'rlj3':  -25.0,
-                           'rlj4': -130.0,
-                           'rlj5':  -45.0,
-                           'rlj6':  -25.0,
-                           'llj1':  -90.0,
-                           'llj2':  -25.0,
-                           'llj3':  -25.0,
-                           'llj4': -130.0,
-                           'llj5':  -45.0,
-                           'llj6':  -45.0,}  
+        self.he         = self.model.effector_array()
+
+        # closed-loop speed control of the joints moved by move_hj_to()
+        self.controller = controller.JointController(self.model)
+
+        # maxima and minima of hinge joints
+        self.hjMax      = self.model.joint_array(self.model.hjMax)
+        self.hjMin      = self.model.joint_array(self.model.hjMin)
 
         # defaults (starting positions) of hinge joints in percent
-        self.hjDefault  = {'hj1' : 0.0,
-                           'hj2' : 0.0,
-                           'raj1': 0.0,
-                           'raj2': 0.0,
-                           'raj3': 0.0,
-                           'raj4': 0.0,
-                           'laj1': 0.0,
-                           'laj2': 0.0,
-                           'laj3': 0.0,
-                           'laj4': 0.0,
-                           'rlj1': 0.0,
-                           'rlj2': 0.0,
-                           'rlj3': 0.0,
-                           'rlj4': 0.0,
-                           'rlj5': 0.0,
-                           'rlj6': 0.0,
-                           'llj1': 0.0,
-                           'llj2': 0.0,
-                           'llj3': 0.0,
-                           'llj4': 0.0,
-                           'llj5': 0.0,
-                           'llj6': 0.0,}   
+        self.hjDefault  = self.model.joint_array()
+
+        # fall detection and get-up reflex, checked before the behaviour
+        self.reflexes   = Reflexes(self)
  
         # create peripheral nervous system (server communication)
         self.pns = PNS(self.agentID, self.teamname,
-                host=self.host, port=self.port, debugLevel=self.debugLevel)
+                host=self.host, port=self.port, model=self.model.scene,
+                debugLevel=self.debugLevel,
+                connectRetries=connectRetries, connectBackoff=connectBackoff,
+                timeout=timeout, sync=sync, transport=transport, attempts=attempts)
 
-        self.perceive()
-        self.pns.beam_effector(startCoordinates[0], startCoordinates[1], startCoordinates[2])
+        try:
+            self.perceive()
+            self.pns.beam_effector(startCoordinates[0], startCoordinates[1], startCoordinates[2])
+            self.pns.flush_effectors()
+        except Exception:
+            # nobody else can close the connection of a robot that never existed
+            self.pns.socket.close()
+            raise
 
         # set default hing joint angles
         for hj in self.hjDefault.keys():
             self.hjDefault[hj] = self.get_hj(hj)
 
-        self.lifeThread = threading.Thread(target=self.live)
-        self.lifeThread.start()
-
         # put arms down
         self.msched.append([self.move_hj_to, {'hj': 'raj1', 'speed': 25, 'percent': 10}])
         self.msched.append([self.move_hj_to, {'hj': 'laj1', 'speed': 25, 'percent': 10}])
 
+        # with autostart=False the caller can configure the robot first
+        # and call start() afterwards
+        self.lifeThread = None
+        if autostart:
+            self.start()
+
+# ==================================== #
+
+    def start(self):
+        """Run the robot in its own thread"""
+
+        if self.lifeThread is not None:
+            return
+
+        self.lifeThread = threading.Thread(target=self.live)
+        self.lifeThread.start()
+
+# ==================================== #
+
+    @property
+    def vision(self):
+        """Decoded vision perceptor, created on first use"""
+        if self._vision is None:
+            self._vision = vision.Vision(self.teamname)
+        return self._vision
+
+# ==================================== #
+
+    @property
+    def localization(self):
+        """Self-localization from landmarks, created on first use"""
+        if self._localization is None:
+            self._localization = localization.ParticleFilter(self.nparticles,
+                    *self.initialPose, side=self.gamestate.get_side() or localization.LEFT)
+        return self._localization
+
+# ==================================== #
+
+    def get_pose(self):
+        """Own pose estimate (x, y, theta) without creating the self-localization"""
+        if self._localization is None:
+            return self.initialPose
+        return self._localization.get_pose()
+
+# ==================================== #
+
+    def get_ball(self):
+        """Global ball position (x, y)
+        Where the robot saw the ball itself during the last ballMemory
+        cycles, otherwise where the team world model fuses it.
+        None if neither knows where the ball is."""
+
+        if self.ballSeenCycle is not None and self.get_cycle() - self.ballSeenCycle <= self.ballMemory:
+            return self.ballGlobal[:2].copy()
+        if self.worldmodel is not None:
+            ball, confidence = self.worldmodel.state.read(
+                    lambda fused: (fused.ball.copy(), fused.ballConfidence))
+            if confidence > 0:
+                return ball
+        return None
+
 
 # ==================================== #
 
@@ -621,61 +1014,191 @@ class NaoRobot(object):
             return
 
         self.alive = True
+        self.start_profiling()
 
-        startSkippingNumber = 10
-
-        iteration         = -1
-        skippedIterations =  0
         while self.alive:
-            iteration += 1
+            try:
+                messages = self.pns.receive_messages()
+                self.timeouts = 0
+                self.step(messages)
+                if self.collector is not None:
+                    self.collector.idle()
+
+            except ServerTimeout as error:
+                if not self.alive:
+                    break
+                if not self.server_silent(error):
+                    continue
+                self.reconnect()
+                continue
+
+            except OSError as error:
+                # server stalled or connection lost
+                if not self.alive:
+                    break
+                print("Robot {} lost connection to server: {}".format(self.agentID, error))
+                self.reconnect()
+                continue
 
-            if self.check_sync() >= startSkippingNumber:
-                while self.check_sync() > 2:
-#                    print(self.check_sync())
-                    self.perceive(skip=True)
-                    iteration         += 1
-                    skippedIterations += 1 
+            if self.stats.cycles * CYCLE_LENGTH % 3.0 == 0:
+#                print("Robot {} lags {} cycles behind after {} iterations".format(self.agentID, self.check_sync(), self.stats.cycles))
+                print("gametime - realtime: {:.5f}".format(self.gamestate.get_gametime() - time.time()))
 
-            self.perceive()
-            self.msched.run()
 
+        # report statistics
+        print("Robot {} lived for {:.1f} seconds,\n\t{}".format(self.agentID, time.time()-self.birthtime, self.stats))
+        self.stop_profiling()
 
-            if iteration * CYCLE_LENGTH % 3.0 == 0:
-#                print("Robot {} lags {} cycles behind after {} iterations".format(self.agentID, self.check_sync(), iteration+1))
-                print("gametime - realtime: {:.5f}".format(self.gamestate.get_gametime() - time.time()))
+# ==================================== #
 
+    def start_profiling(self):
+        """Measure the allocations of every stage of step() from now on,
+        if the robot was created with profile=True"""
+        if self.profiler is not None and not self.profiler.wrapped:
+            self.profiler.attach()
 
-        # report statistics
-        iterations = iteration + 1
-        print("Robot {} lived for {:.1f} seconds,\n\ti.e. {} iterations, {} of which have been skipped ({:.2f}%).".format(self.agentID, time.time()-self.realstarttime, iterations, skippedIterations, 100.0*skippedIterations/iterations))
+# ==================================== #
+
+    def stop_profiling(self):
+        """Report the allocations per stage measured so far
+        and restore the stage methods"""
+        if self.profiler is None or not self.profiler.wrapped:
+            return
+        print("Robot {} allocations per stage:\n{}".format(self.agentID, self.profiler))
+        self.profiler.detach()
+
+# ==================================== #
+
+    def step(self, messages):
+        """Process the perceptor messages that arrived since the last step
+        and run one control cycle on the most recent one.
+        Older messages are perceived as well, unless the robot lags
+        startSkippingNumber cycles behind real time. Then they are skipped,
+        i.e. only their time is read, until the lag is down to 2 cycles."""
+
+        start = time.time()
 
+        skipped = 0
+        for message in messages[:-1]:
+            sync = self.check_sync()
+            if sync >= self.startSkippingNumber:
+                self.skipping = True
+            elif sync <= 2:
+                self.skipping = False
+            self.perceive(skip=self.skipping, message=message)
+            if self.skipping:
+                skipped += 1
+
+        self.perceive(message=messages[-1])
+        self.reflexes.check()
+        # the get-up motion owns the joints, the behaviour waits for it
+        if self.behaviour is not None and not self.reflexes.is_active():
+            self.behaviour.tick(self)
+        self.msched.run()
+        self.control()
+        self.communicate()
+        self.pns.flush_effectors()
+
+        # signal waiting threads
+        if len(self.msched) == 0:
+            if not self.idle.is_set():
+                self.idle.set()
+        elif self.idle.is_set():
+            self.idle.clear()
+        with self.newCycle:
+            self.newCycle.notify_all()
+
+        end = time.time()
+        if self.stepEnd is not None:
+            self.stats.add(start - self.stepEnd, end - start, len(messages), skipped)
+        self.stepEnd = end
+
+# ==================================== #
+
+    def server_silent(self, error):
+        """Count a ServerTimeout and return True if the server was silent
+        for maxTimeouts timeouts in a row, i.e. the robot should reconnect.
+        Until then the connection is kept, and the time is synchronized
+        again with the next message, so the pause is not taken for lag."""
+
+        self.timeouts += 1
+        if self.timeouts >= self.maxTimeouts:
+            print("Robot {} lost connection to server: {}".format(self.agentID, error))
+            self.timeouts = 0
+            return True
+
+        if self.debugLevel > 0:
+            print("Robot {} waits for the server: {}".format(self.agentID, error))
+        self.resync()
+        return False
+
+# ==================================== #
+
+    def resync(self):
+        """Synchronize the time again with the next perceptor message,
+        e.g. after the server paused"""
+        self.realstarttime = None
+        self.simstarttime  = None
+
+# ==================================== #
+
+    def reconnect(self):
+        """Restore the connection to the server after it was lost and put
+        the robot back on the field. Scheduled movements and what was
+        perceived of the world are kept, the own pose is reset to the
+        beam position."""
+
+        while self.alive:
+            try:
+                self.pns.reconnect()
+
+                # the server has a fresh robot, all joints are at rest
+                # and the time has to be synchronized again
+                self.he.values[:]  = 0.0
+                self.controller.stop()
+                self.realstarttime = None
+                self.simstarttime  = None
+
+                self.perceive()
+                self.pns.beam_effector(self.startCoordinates[0], self.startCoordinates[1],
+                        self.startCoordinates[2])
+                self.pns.flush_effectors()
+                self.initialPose[:] = self.startCoordinates
+                if self._localization is not None:
+                    self._localization.reset(*self.startCoordinates)
+
+                self.reconnects += 1
+                return
+
+            except OSError as error:
+                print("Robot {} could not reconnect: {}".format(self.agentID, error))
 
 # ==================================== #
 
     def die(self, timeout=0):
         """Stop robot execution and close socket connection to server
         If timeout is > 0, give the robot some time to finish scheduled movements."""
-        start    = time.time()
-        timeleft = timeout - time.time() + start
-        while timeleft > 0:
-            if len(self.msched) == 0:
-                self.alive = False
-                break
-            timeleft = timeout - time.time() + start
+        if timeout > 0:
+            self.idle.wait(timeout)
         self.alive = False
-        self.lifeThread.join()
+        if self.lifeThread is not None:
+            self.lifeThread.join()
         self.pns.socket.close()
 
 # ==================================== #
 
-    def perceive(self, skip=False):
+    def perceive(self, skip=False, message=None):
         """Receive perceptor information from server and
-        update status accordingly"""
+        update status accordingly.
+        If message is given, it is used instead of receiving the next one."""
 
 #        start = time.time()
-        perceptors = self.pns.receive_perceptors()
+        if message is None:
+            message = self.pns.receive_message()
+        perceptors = self.pns.parse_perceptors(message)
 #        print("receive_perceptors() took {:.8f} sec.".format(time.time()-start))
 
+        seen = False
         for perceptor in perceptors:
 
             # time
@@ -698,6 +1221,10 @@ class NaoRobot(object):
                         self.gamestate.set_gametime(field[1])
                     elif field[0] == 'pm':
                         self.gamestate.set_playmode(field[1])
+                    elif field[0] == 'team' and field[1] != self.gamestate.get_side():
+                        self.gamestate.set_side(field[1])
+                        if self._localization is not None:
+                            self._localization.set_side(field[1])
 
             # gyroscope
             elif perceptor[0] == 'GYR':
@@ -709,7 +1236,8 @@ class NaoRobot(object):
 
             # vision information
             elif perceptor[0] == 'See':
-                pass 
+                self.vision.update(perceptor[1:])
+                seen = True
 
             # hinge joints
             elif perceptor[0] == 'HJ':
@@ -719,18 +1247,163 @@ class NaoRobot(object):
             elif perceptor[0] == 'FRP':
                 self.frp[perceptor[1][1]].set(perceptor[2][1:], perceptor[3][1:])
 
+            # messages of team mates
+            elif perceptor[0] == 'hear':
+                teammsg = self.teamcomm.receive(perceptor, self.get_cycle())
+                if teammsg is not None and self.worldmodel is not None:
+                    self.report_message(teammsg)
+
             # unknown perceptor
             else:
                 if self.debugLevel >= 10:
                     print("DEBUG: unknown perceptor: {}".format(perceptor[0]))
                     print(perceptor)
+
+        if not skip:
+            self.localize(seen)
+            self.publish_state()
          
+# ==================================== #
+
+    def localize(self, seen):
+        """Update the pose estimate with the gyroscope rotation of this cycle
+        and, if a vision perceptor arrived, with the observed landmarks"""
+
+        if self._localization is None and not seen:
+            # nothing to localize with yet, keep track of the turns only
+            theta = self.initialPose[2] + self.gyr.rate[2] * CYCLE_LENGTH
+            self.initialPose[2] = (theta + 180.0) % 360.0 - 180.0
+            if self.worldmodel is not None:
+                self.report_observations(seen)
+            return
+
+        self.localization.predict(self.gyr.rate[2] * CYCLE_LENGTH)
+        if seen:
+            self.localization.update(self.vision.landmarkVisible,
+                    self.vision.landmarkPolar, headYaw=self.hj['hj1'])
+        pose = self.localization.estimate()
+
+        if seen and self.vision.ball_visible():
+            self.ballGlobal[:] = localization.local2global(pose, self.vision.ballPos, self.hj['hj1'])
+            self.ballSeenCycle = self.get_cycle()
+
+        if self.worldmodel is not None:
+            self.report_observations(seen)
+
+# ==================================== #
+
+    def report_observations(self, seen):
+        """Report own pose and, if a vision perceptor arrived,
+        ball and opponents to the team world model"""
+
+        pose        = self.get_pose()
+        ball        = None
+        opponentIDs = ()
+        opponents   = ()
+
+        if seen:
+            if self.vision.ball_visible():
+                ball = self.ballGlobal
+            opponentIDs, opponents = self.vision.get_players(own=False)
+            opponents = localization.local2global(pose, opponents, self.hj['hj1'])
+
+        self.worldmodel.report(self.agentID, self.gamestate.get_time(), pose=pose,
+                ball=ball, opponentIDs=opponentIDs, opponents=opponents)
+
+# ==================================== #
+
+    def report_message(self, message, confidence=0.5):
+        """Report what a team mate said to the team world model"""
+
+        time = message.cycle * CYCLE_LENGTH
+        ball = None
+        if message.ballAge < TeamMessage.MAXBALLAGE:
+            ball = (message.ballX, message.ballY)
+
+        self.worldmodel.report(message.unum, time,
+                pose=(message.x, message.y, message.theta), poseConfidence=confidence,
+                ball=ball, ballTime=time - message.ballAge * CYCLE_LENGTH,
+                ballConfidence=confidence)
+
+# ==================================== #
+
+    def communicate(self):
+        """Tell the team mates about own position and the ball,
+        if it is this robot's turn to speak"""
+
+        cycle = self.get_cycle()
+        if not self.teamcomm.should_say(cycle):
+            return
+
+        x, y, theta = self.get_pose()
+        message = TeamMessage(unum=self.agentID, role=self.role, cycle=cycle,
+                x=x, y=y, theta=theta, fallen=self.reflexes.is_active())
+        if self.ballSeenCycle is not None:
+            message.ballX   = self.ballGlobal[0]
+            message.ballY   = self.ballGlobal[1]
+            message.ballAge = min(cycle - self.ballSeenCycle, TeamMessage.MAXBALLAGE)
+
+        self.pns.say_effector(self.teamcomm.encode(message))
+
+# ==================================== #
+
+    def control(self):
+        """Send the speeds the JointController computed for the joints
+        that are moving to a target, if they changed"""
+
+        changed = self.controller.update(self.hj.values)
+        rate    = self.controller.rate
+        for i in changed:
+            self.pns.hinge_joint_effector(self.model.effectors[i], rate[i])
+            self.he.values[i] = rate[i]
+
+# ==================================== #
+
+    def get_cycle(self):
+        """Number of the current simulation cycle according to the server time"""
+        return int(round(self.gamestate.get_time() / CYCLE_LENGTH))
+
+# ==================================== #
+
+    def publish_state(self):
+        """Copy the perceived state into the back buffer and swap it
+        to the front, once all perceptors of this cycle are decoded"""
+
+        self.cycle += 1
+        self.state.back.update(self, self.cycle)
+        self.state.publish()
+
+# ==================================== #
+
+    def get_state(self):
+        """Return a consistent copy of the most recently perceived world state
+        Safe to call from any thread"""
+        return self.state.read()
+
+# ==================================== #
+
+    def set_behaviour(self, behaviour):
+        """Let the behaviour tree with the given root node
+        decide what the robot does from the next cycle on"""
+        self.behaviour = behaviour
+
+# ==================================== #
+
+    def wait_cycle(self, timeout=None):
+        """Sleep until the robot finished its next cycle
+        Return False if timeout seconds passed before"""
+        with self.newCycle:
+            return self.newCycle.wait(timeout)
+
 # ==================================== #
 
     def check_sync(self):
         """Check if perceived time is in sync with real time
         Return True if so, else False"""
 
+        if self.realstarttime is None:
+            return 0
+
         realruntime = time.time() - self.realstarttime
         simruntime  = self.gamestate.get_time() - self.simstarttime
 
@@ -765,7 +1438,9 @@ class NaoRobot(object):
         The angle can be given in degree (angle=<degree>)
         or percent (percent=<percentage>). If both are specified, the angle keyword
         gets priority.
-        Speed is specified in percent of maximum speed"""
+        Speed is specified in percent of maximum speed.
+        The joint speed is set by the JointController in control(),
+        this only sets the target and checks if it was reached."""
 
         # get corresponding hinge effector
         he = self.hjEffector[hj]
@@ -784,31 +1459,34 @@ class NaoRobot(object):
         elif speed < 0:   speed = 0.0
 
         speed = speed/100.0 * self.maxhjSpeed
-        accuracy = 0.1
-        diff  = self.hj[hj] - angle
+        i     = self.model.index[hj]
+        self.controller.set_target(i, angle, speed)
 
-        if abs(diff) <= accuracy:
+        if self.controller.reached(i, self.hj[hj]):
+            self.controller.release(i)
             self.pns.hinge_joint_effector(he, 0.0)
             self.he[he] = 0.0
             if self.debugLevel > 20:
                 print(hj, "done")
             return "done"
 
-        if abs(speed) > abs(diff)/4.0:
-            speed = abs(diff)/4.0
-
         if self.debugLevel > 20:
-            print("hj: {}, he: {} target={:.2f}, current={:.2f}, diff={:.2f}, speed={:.2f}".format(hj, he, angle, self.hj[hj], diff, speed))
-
-        if self.hj[hj] < angle:
-            self.pns.hinge_joint_effector(he, abs(speed))
-            self.he[he] = abs(speed) 
-        elif self.hj[hj] > angle:
-            self.pns.hinge_joint_effector(he, -abs(speed))
-            self.he[he] = -abs(speed)
+            print("hj: {}, he: {} target={:.2f}, current={:.2f}, diff={:.2f}, speed={:.2f}".format(hj, he, angle, self.hj[hj], self.hj[hj] - angle, self.he[he]))
 
         return "not done"
 
+# ==================================== #
+
+    def release_hj(self, hj):
+        """Stop the given hinge joint and take it from the JointController,
+        e.g. when the movement driving it was dropped"""
+
+        self.controller.release(self.model.index[hj])
+        he = self.hjEffector[hj]
+        if self.he[he] != 0.0:
+            self.pns.hinge_joint_effector(he, 0.0)
+            self.he[he] = 0.0
+
 # ==================================== #
 
     def move_hj_by(self, hj, angle=None, percent=None, speed=25):
@@ -853,7 +1531,7 @@ class NaoRobot(object):
         """Make a step with the left foot"""
 
         done = [False]
-        print("ACC:", np.linalg.norm(self.acc.get()))
+        print("ACC:", np.linalg.norm(self.get_state().acc))
 
         done[0] = False
 #        self.msched.append([self.move_hj_to, {'hj': 'rlj3', 'percent': 50}, done])
@@ -890,13 +1568,14 @@ class NaoRobot(object):
     def test_orientation(self, length=1.0):
         start = time.time()
         while time.time() - start < length:
+            state = self.get_state()
             print("time: {:.3f}".format(time.time()-start))
-            print(self.gyr.rate)
-            print(self.gyr.x)
-            print(self.gyr.y)
-            print(self.gyr.z) 
+            print(state.gyrRate)
+            print(state.gyrX)
+            print(state.gyrY)
+            print(state.gyrZ) 
             print("")
-            time.sleep(CYCLE_LENGTH)
+            self.wait_cycle(CYCLE_LENGTH)
 
 
 # ============================================================================ #
@@ -905,39 +1584,45 @@ class NaoRobot(object):
 # UTILITY FUNCTIONS #
 #####################
 
-def rotate_arbitrary(axis, point, angle=None, degree=True):
+def rotate_arbitrary(axis, point, angle=None, degree=True, out=None):
     """Rotate the 3D point about the given axis.
     If axis is not normalized and angle is None, the angle is taken as the norm
-    of axis. If degree == False, angles are expected in radiant."""
+    of axis. If degree == False, angles are expected in radiant.
+    If out is given, the result is written into it instead of a new array,
+    out may be point itself."""
+
+    if out is None:
+        out = np.empty(3)
 
     # ensure axis is unit length
-    axisNorm = np.linalg.norm(axis)
-    if axisNorm == 0: return point
-    axisn    = axis / axisNorm
+    axisNorm = math.sqrt(axis[0]*axis[0] + axis[1]*axis[1] + axis[2]*axis[2])
+    if axisNorm == 0:
+        out[:] = point
+        return out
     if angle == None:
         angle = axisNorm
         
     if degree:
         # convert to radiant
-        angle *= np.pi / 180.0
+        angle *= math.pi / 180.0
 
-    u = axisn[0]
-    v = axisn[1]
-    w = axisn[2]
+    u = axis[0] / axisNorm
+    v = axis[1] / axisNorm
+    w = axis[2] / axisNorm
     x = point[0]
     y = point[1]
     z = point[2]
 
     sin = math.sin(angle)
     cos = math.cos(angle)
-    dot = np.dot(axisn, point)
+    dot = u*x + v*y + w*z
     tmp = dot * (1 - cos)
 
-    result = np.array([u * tmp + x*cos + (-w*y + v*z) * sin, \
-                       v * tmp + y*cos + ( w*x - u*z) * sin, \
-                       w * tmp + z*cos + (-v*x + u*y) * sin])
+    out[0] = u * tmp + x*cos + (-w*y + v*z) * sin
+    out[1] = v * tmp + y*cos + ( w*x - u*z) * sin
+    out[2] = w * tmp + z*cos + (-v*x + u*y) * sin
 
-    return result
+    return out
 
 # ============================================================================ #
 
@@ -960,4 +1645,19 @@ class QueueItemError(Exception):
         self.value = value
     def __str__(self):
         return repr(self.value) 
+
+class ConnectionClosed(OSError):
+    """Raised if the simulation server closed the connection"""
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
+
+class ServerTimeout(OSError):
+    """Raised if the simulation server did not send anything
+    within the socket timeout"""
+    def __init__(self, value):
+        self.value = value
+    def __str__(self):
+        return repr(self.value)
  
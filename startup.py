@@ -0,0 +1,82 @@
+#! /usr/bin/env python3
+
+
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from simpleAgent import NaoRobot
+
+# ============================================================================ #
+
+class AgentStartup(object):
+    """Readiness of one agent during team startup
+    robot is the NaoRobot once it is on the field, error the exception
+    that prevented it from getting there."""
+
+    def __init__(self, agentID):
+        self.agentID  = agentID
+        self.robot    = None
+        self.error    = None
+        self.elapsed  = None # seconds from start of team startup
+        self.attempts = 0    # connection attempts
+
+# ==================================== #
+
+    def is_ready(self):
+        return self.robot is not None
+
+# ==================================== #
+
+    def __str__(self):
+        if self.is_ready():
+            return "Agent {:2d} ready after {:.3f} sec. ({} connection attempts)".format(
+                    self.agentID, self.elapsed, self.attempts)
+        else:
+            return "Agent {:2d} failed after {:.3f} sec. ({} connection attempts): {}".format(
+                    self.agentID, self.elapsed, self.attempts, self.error)
+
+
+# ============================================================================ #
+
+#####################
+# UTILITY FUNCTIONS #
+#####################
+
+def start_team(teamname, agentIDs, startCoordinates=None, callback=None, **kwargs):
+    """Connect, handshake and beam all agents of a team concurrently.
+    The scene and init round trips of all agents overlap instead of running
+    one agent after the other, and each agent retries its connection with
+    exponential backoff if the server is still starting up.
+    startCoordinates    dictionary of beam coordinates by agentID
+    callback            called with the AgentStartup of each agent as soon
+                        as it is ready or has failed
+    All other keyword arguments are passed on to NaoRobot.
+    Return a dictionary of AgentStartup objects by agentID."""
+
+    start    = time.time()
+    statuses = {agentID: AgentStartup(agentID) for agentID in agentIDs}
+    attempts = {agentID: [0] for agentID in agentIDs}
+
+    def start_agent(agentID):
+        options = dict(kwargs)
+        # counted by the PNS, readable even if the robot is never created
+        options['attempts'] = attempts[agentID]
+        if startCoordinates is not None and agentID in startCoordinates:
+            options['startCoordinates'] = startCoordinates[agentID]
+        return NaoRobot(agentID, teamname, **options)
+
+    with ThreadPoolExecutor(max_workers=max(1, len(statuses))) as executor:
+        futures = {executor.submit(start_agent, agentID): agentID for agentID in agentIDs}
+
+        for future in as_completed(futures):
+            status = statuses[futures[future]]
+            status.elapsed = time.time() - start
+            try:
+                status.robot = future.result()
+            except Exception as error:
+                status.error = error
+            status.attempts = attempts[status.agentID][0]
+            if callback is not None:
+                callback(status)
+
+    return statuses
@@ -0,0 +1,60 @@
+#! /usr/bin/env python3
+"""Measure how quickly agent processes start up.
+Times the import of the agent module in fresh interpreters, the loading of
+and compiling of the robot model, and, if a simulation server is reachable, the
+construction of a NaoRobot up to the point where it is on the field.
+
+usage: startup_benchmark.py [repetitions] [--server host:port]"""
+
+
+import sys, os, time, subprocess
+import statistics
+
+# ============================================================================ #
+
+def time_subprocess(code, repetitions):
+    """Median wall time in seconds to run code in a fresh interpreter"""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    timings   = []
+    for i in range(repetitions):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable, '-c', code], cwd=directory)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+# ==================================== #
+
+def main(argv):
+    repetitions = 10
+    server      = None
+    args        = list(argv)
+    if '--server' in args:
+        i      = args.index('--server')
+        server = args[i+1]
+        del args[i:i+2]
+    if len(args) > 0:
+        repetitions = int(args[0])
+
+    baseline = time_subprocess('pass', repetitions)
+    agent    = time_subprocess('import simpleAgent', repetitions)
+    print("interpreter startup:       {:8.2f} ms".format(1000*baseline))
+    print("import simpleAgent:        {:8.2f} ms (+{:.2f} ms)".format(1000*agent, 1000*(agent-baseline)))
+
+    import simpleAgent, robotmodel
+    start = time.perf_counter()
+    robotmodel.load_model('nao')
+    print("load robot model (first):  {:8.2f} ms".format(1000*(time.perf_counter()-start)))
+    start = time.perf_counter()
+    robotmodel.load_model('nao')
+    print("load robot model (cached): {:8.2f} ms".format(1000*(time.perf_counter()-start)))
+
+    if server is not None:
+        host, port = server.split(':')
+        start = time.perf_counter()
+        robot = simpleAgent.NaoRobot(1, 'benchmark', host=host, port=int(port), autostart=False)
+        print("NaoRobot on the field:     {:8.2f} ms".format(1000*(time.perf_counter()-start)))
+        robot.die()
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
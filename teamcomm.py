@@ -0,0 +1,219 @@
+#! /usr/bin/env python3
+
+
+import zlib
+
+from lazy import lazy_import
+
+localization = lazy_import('localization')
+
+# ============================================================================ #
+
+# Constants
+# characters allowed by the say effector: printable ASCII without
+# white space and normal brackets
+ALPHABET   = ''.join(chr(c) for c in range(0x21, 0x7F) if chr(c) not in '()')
+BASE       = len(ALPHABET)
+MSGLENGTH  = 20 # characters per say message
+
+# the first character tags the team, it is always a letter, which also keeps
+# the perceptor parser from converting a message to a number
+TAGS       = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+# bit layout of the payload: (field, bits, minimum, resolution)
+FIELDS = (('unum',     4,   0.0,  1.0  ),
+          ('role',     4,   0.0,  1.0  ),
+          ('cycle',   14,   0.0,  1.0  ),
+          ('x',       15, -16.0,  0.001),
+          ('y',       15, -11.0,  0.001),
+          ('theta',   10,   0.0,  0.5  ),
+          ('ballX',   15, -16.0,  0.001),
+          ('ballY',   15, -11.0,  0.001),
+          ('ballAge',  8,   0.0,  1.0  ),
+          ('fallen',   1,   0.0,  1.0  ))
+CHECKBITS  = 16
+PAYLOADBITS = sum(field[1] for field in FIELDS) + CHECKBITS
+
+# ============================================================================ #
+
+class TeamMessage(object):
+    """Structured content of one say message
+    Positions are global field coordinates in meter, theta in degree,
+    decoded into [-180, 180).
+    ballAge is the number of cycles since the sender saw the ball,
+    MAXBALLAGE means it has not seen the ball at all."""
+
+    MAXBALLAGE = 2**8 - 1
+
+    def __init__(self, unum=0, role=0, cycle=0, x=0.0, y=0.0, theta=0.0,
+            ballX=0.0, ballY=0.0, ballAge=MAXBALLAGE, fallen=False):
+        self.unum    = unum
+        self.role    = role
+        self.cycle   = cycle
+        self.x       = x
+        self.y       = y
+        self.theta   = theta
+        self.ballX   = ballX
+        self.ballY   = ballY
+        self.ballAge = ballAge
+        self.fallen  = fallen
+
+        # set upon receiving
+        self.hearTime  = None
+        self.direction = None
+
+# ==================================== #
+
+    def __str__(self):
+        string = ""
+        for name, bits, minimum, resolution in FIELDS:
+            string += "{:<8}= {}\n".format(name, getattr(self, name))
+        return string[:-1]
+
+
+# ============================================================================ #
+
+
+class TeamComm(object):
+    """Team communication over the say effector and hear perceptor
+    Messages are quantized into a fixed bit layout and packed as one large
+    integer into base 92 digits, i.e. 6.5 bits per character.
+    To avoid collisions, the players of a team take turns: every period
+    cycles the next player in line is allowed to speak."""
+
+    def __init__(self, unum, teamname, nplayers=11, period=2):
+        self.unum     = unum
+        self.teamname = teamname
+        self.nplayers = nplayers
+        self.period   = period
+
+        self.salt = bytes(teamname, 'ASCII')
+        self.tag  = TAGS[zlib.crc32(self.salt) % len(TAGS)]
+
+        # most recent message from each team mate, by unum
+        self.messages = {}
+
+        if 2**PAYLOADBITS > BASE**(MSGLENGTH - 1):
+            raise ValueError("Team message layout exceeds the say message length.")
+
+# ==================================== #
+
+    def should_say(self, cycle):
+        """Return True if this player is scheduled to speak in the given
+        cycle, which must be derived from the server time that all players
+        share"""
+        if cycle % self.period != 0:
+            return False
+        return (cycle // self.period) % self.nplayers == (self.unum - 1) % self.nplayers
+
+# ==================================== #
+
+    def encode(self, message):
+        """Pack a TeamMessage into a string for the say effector"""
+
+        value = 0
+        for name, bits, minimum, resolution in FIELDS:
+            field = getattr(message, name)
+            if name == 'theta':
+                field %= 360.0
+            field = int(round((field - minimum) / resolution))
+            if name == 'cycle':
+                field %= 2**bits
+            else:
+                field = min(max(field, 0), 2**bits - 1)
+            value = (value << bits) | field
+
+        value = (value << CHECKBITS) | self._checksum(value)
+
+        digits = []
+        for i in range(MSGLENGTH - 1):
+            value, digit = divmod(value, BASE)
+            digits.append(ALPHABET[digit])
+
+        return self.tag + ''.join(reversed(digits))
+
+# ==================================== #
+
+    def decode(self, string, referenceCycle=None):
+        """Unpack a say message into a TeamMessage.
+        Return None if the message does not stem from this team
+        or names no player of it.
+        The truncated cycle stamp is expanded to the latest cycle not after
+        referenceCycle, if given."""
+
+        if type(string) != str or len(string) != MSGLENGTH or string[0] != self.tag:
+            return None
+
+        value = 0
+        for c in string[1:]:
+            digit = ALPHABET.find(c)
+            if digit < 0:
+                return None
+            value = value * BASE + digit
+
+        checksum = value & (2**CHECKBITS - 1)
+        value  >>= CHECKBITS
+        if checksum != self._checksum(value):
+            return None
+
+        message = TeamMessage()
+        for name, bits, minimum, resolution in reversed(FIELDS):
+            field  = value & (2**bits - 1)
+            value >>= bits
+            if resolution == 1.0 and minimum == 0.0:
+                setattr(message, name, field)
+            else:
+                setattr(message, name, minimum + field * resolution)
+        if not 1 <= message.unum <= self.nplayers:
+            return None
+        message.fallen = bool(message.fallen)
+        message.theta  = localization.wrap_angle(message.theta)
+
+        if referenceCycle is not None:
+            modulus = 2**FIELDS[2][1]
+            message.cycle = referenceCycle - (referenceCycle - message.cycle) % modulus
+
+        return message
+
+# ==================================== #
+
+    def receive(self, perceptor, referenceCycle=None):
+        """Decode a parsed hear perceptor.
+        The perceptor is either ['hear', time, direction, message] or, with
+        newer servers, ['hear', team, time, direction, message], where
+        direction is 'self' for the own messages.
+        Return the decoded TeamMessage or None."""
+
+        if len(perceptor) == 5:
+            hearTime, direction, string = perceptor[2:]
+        elif len(perceptor) == 4:
+            hearTime, direction, string = perceptor[1:]
+        else:
+            return None
+
+        if direction == 'self':
+            return None
+
+        message = self.decode(string, referenceCycle)
+        if message is None:
+            return None
+
+        message.hearTime  = hearTime
+        message.direction = direction
+        self.messages[message.unum] = message
+
+        return message
+
+# ==================================== #
+
+    def get_messages(self):
+        """Most recent message of each team mate, keyed by player number"""
+        return self.messages
+
+# ==================================== #
+
+    def _checksum(self, value):
+        """Checksum of the payload, salted with the team name
+        so that messages of the opponent are rejected"""
+        payload = value.to_bytes((PAYLOADBITS + 7) // 8, 'big')
+        return zlib.crc32(payload + self.salt) & (2**CHECKBITS - 1)
@@ -0,0 +1,4 @@
+import os, sys
+
+# the modules live at the top level of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
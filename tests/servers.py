@@ -0,0 +1,101 @@
+import socket, struct, threading, time
+
+
+# torso upright and at rest, nothing else perceived
+FRAME = ("(time (now {:.2f}))(GS (t {:.2f}) (pm PlayOn))"
+         "(GYR (n torso) (rt 0.00 0.00 0.00))(ACC (n torso) (a 0.00 0.00 9.81))")
+
+
+def pack(message):
+    message = bytes(message, 'ASCII')
+    return struct.pack('!I', len(message)) + message
+
+
+class ScriptedServer(object):
+    """Stand-in of the simulation server that plays one script per connection
+    Every connection is answered like the server answers scene and init,
+    with one and two frames, then the next script is called with the server
+    and the connection. The connection is closed once the script returns.
+    A script with a handshake attribute answers scene and init itself.
+    Received messages are collected in received."""
+
+    def __init__(self, *scripts, cycle=0):
+        self.scripts  = scripts
+        self.cycle    = cycle
+        self.received = []
+        self.error    = None
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('localhost', 0))
+        self.listener.listen(len(scripts))
+        self.port     = self.listener.getsockname()[1]
+
+        self.thread   = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        try:
+            for script in self.scripts:
+                connection, address = self.listener.accept()
+                with connection:
+                    if not getattr(script, 'handshake', False):
+                        self.handshake(connection)
+                    script(self, connection)
+        except Exception as error:
+            self.error = error
+        finally:
+            self.listener.close()
+
+    def handshake(self, connection, frames=2):
+        """Answer scene with one frame and init with frames frames"""
+        self.receive(connection)
+        self.send(connection)
+        self.receive(connection)
+        self.send(connection, frames)
+
+    def join(self, timeout=5.0):
+        self.thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+
+    def frame(self):
+        self.cycle += 1
+        now = self.cycle * 0.02
+        return FRAME.format(now, now)
+
+    def send(self, connection, count=1, interval=0.0):
+        for i in range(count):
+            connection.sendall(pack(self.frame()))
+            if interval > 0:
+                time.sleep(interval)
+
+    def receive(self, connection):
+        """Next message of the agent, None if it closed the connection"""
+        header = self._read(connection, 4)
+        if header is None:
+            return None
+        message = str(self._read(connection, struct.unpack('!I', header)[0]), 'ASCII')
+        self.received.append(message)
+        return message
+
+    def _read(self, connection, length):
+        data = b''
+        while len(data) < length:
+            chunk = connection.recv(length - len(data))
+            if len(chunk) == 0:
+                return None
+            data += chunk
+        return data
+
+    def wait_closed(self, connection, timeout=5.0):
+        """Wait until the agent closed the connection
+        Return False if it did not within timeout seconds."""
+        connection.settimeout(timeout)
+        try:
+            while connection.recv(65536):
+                pass
+        except socket.timeout:
+            return False
+        except OSError:
+            pass
+        return True
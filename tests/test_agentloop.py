@@ -0,0 +1,60 @@
+import time
+
+import robotmodel
+from agentloop import AgentLoop
+from simpleAgent import NaoRobot
+from tuning import KinematicServer
+from servers import ScriptedServer
+
+
+def test_robots_step_on_their_messages():
+    model   = robotmodel.load_model()
+    servers = [KinematicServer(model, realtime=True) for i in range(2)]
+    robots  = [NaoRobot(i + 1, 'test', port=server.port, autostart=False)
+               for i, server in enumerate(servers)]
+
+    loop = AgentLoop(robots)
+    loop.run(duration=0.5)
+    for robot in robots:
+        robot.die()
+
+    for robot in robots:
+        assert 15 <= robot.stats.cycles <= 30
+    assert 0.0 < loop.get_load() < 1.0
+
+
+def test_server_pause_does_not_reconnect():
+    def script(server, connection):
+        server.send(connection, 10, interval=0.02)
+        time.sleep(0.35)
+        server.send(connection, 10, interval=0.02)
+        server.wait_closed(connection)
+
+    server = ScriptedServer(script)
+    robot  = NaoRobot(1, 'test', port=server.port, autostart=False)
+    loop   = AgentLoop([robot], timeout=0.1)
+    loop.run(duration=0.9)
+    robot.die()
+    server.join()
+
+    assert robot.reconnects == 0
+    assert robot.stats.cycles >= 15
+
+
+def test_closed_connection_is_reconnected():
+    def close(server, connection):
+        server.send(connection, 5, interval=0.02)
+
+    def serve(server, connection):
+        server.send(connection, 10, interval=0.02)
+        server.wait_closed(connection)
+
+    server = ScriptedServer(close, serve)
+    robot  = NaoRobot(1, 'test', port=server.port, autostart=False)
+    loop   = AgentLoop([robot], timeout=0.1)
+    loop.run(duration=0.6)
+    robot.die()
+    server.join()
+
+    assert robot.reconnects == 1
+    assert robot.stats.cycles >= 10
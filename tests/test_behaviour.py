@@ -0,0 +1,203 @@
+import pytest
+
+import robotmodel
+from behaviour import (Condition, Action, Schedule, Sequence, Selector, Memo, PlayModeSwitch,
+                       SUCCESS, FAILURE, RUNNING)
+from simpleAgent import NaoRobot
+from tuning import KinematicServer
+
+
+class Robot(object):
+    """Just enough of a robot for nodes that do not move anything"""
+
+    def __init__(self, playmode='PlayOn'):
+        self.cycle    = 0
+        self.playmode = playmode
+        self.gamestate = self
+
+    def get_playmode(self):
+        return self.playmode
+
+
+class Leaf(Action):
+    """Action that returns the given states in turn and counts ticks and resets"""
+
+    def __init__(self, *states):
+        super().__init__(lambda robot: self.states.pop(0) if len(self.states) > 1 else self.states[0])
+        self.states = list(states)
+        self.ticks  = 0
+        self.resets = 0
+
+    def tick(self, robot):
+        self.ticks += 1
+        return super().tick(robot)
+
+    def reset(self):
+        self.resets += 1
+
+
+def test_condition_is_evaluated_once_per_cycle():
+    calls = []
+    def ready(robot):
+        calls.append(robot.cycle)
+        return True
+
+    robot     = Robot()
+    condition = Condition(ready)
+    tree      = Sequence(condition, condition)
+    assert tree.tick(robot) == SUCCESS
+    robot.cycle += 1
+    assert tree.tick(robot) == SUCCESS
+    assert calls == [0, 1]
+    assert condition.name == 'ready'
+
+
+def test_action_states():
+    robot = Robot()
+    assert Action(lambda robot: "done").tick(robot) == SUCCESS
+    assert Action(lambda robot: "not done").tick(robot) == RUNNING
+    assert Action(lambda robot, result: result, {'result': FAILURE}).tick(robot) == FAILURE
+
+
+def test_sequence_continues_with_running_child():
+    robot  = Robot()
+    first  = Leaf(SUCCESS)
+    second = Leaf(RUNNING, RUNNING, SUCCESS)
+    tree   = Sequence(first, second)
+
+    assert tree.tick(robot) == RUNNING
+    assert tree.tick(robot) == RUNNING
+    assert tree.tick(robot) == SUCCESS
+    assert (first.ticks, second.ticks) == (1, 3)
+    # finished, the next tick starts over
+    assert tree.current == 0
+
+
+def test_sequence_reset_stops_at_running_child():
+    robot  = Robot()
+    first  = Leaf(SUCCESS)
+    second = Leaf(RUNNING)
+    third  = Leaf(SUCCESS)
+    tree   = Sequence(first, second, third)
+
+    assert tree.tick(robot) == RUNNING
+    tree.reset()
+    assert (first.resets, second.resets, third.resets) == (1, 1, 0)
+    assert tree.current == 0
+
+    failing = Sequence(Leaf(SUCCESS), Leaf(FAILURE), third)
+    assert failing.tick(robot) == FAILURE
+    assert third.ticks == 0
+
+
+def test_selector_resets_branch_that_lost_priority():
+    robot = Robot()
+    urgent = {'value': False}
+    high  = Sequence(Condition(lambda robot: urgent['value'], 'urgent'), Leaf(RUNNING))
+    low   = Leaf(RUNNING)
+    tree  = Selector(high, low)
+
+    assert tree.tick(robot) == RUNNING
+    assert low.resets == 0
+    urgent['value'] = True
+    robot.cycle += 1
+    assert tree.tick(robot) == RUNNING
+    assert low.resets == 1
+    assert tree.running == 0
+
+
+def test_memo_skips_subtree_while_inputs_do_not_change():
+    robot  = Robot()
+    inputs = {'key': 1}
+    child  = Leaf(SUCCESS)
+    memo   = Memo(lambda robot: inputs['key'], child)
+
+    for i in range(3):
+        assert memo.tick(robot) == SUCCESS
+    assert child.ticks == 1
+    inputs['key'] = 2
+    assert memo.tick(robot) == SUCCESS
+    assert child.ticks == 2
+
+    memo.reset()
+    assert memo.tick(robot) == SUCCESS
+    assert (child.ticks, child.resets) == (3, 1)
+
+
+def test_memo_keeps_ticking_running_subtree():
+    robot = Robot()
+    child = Leaf(RUNNING, RUNNING, FAILURE)
+    memo  = Memo(lambda robot: 0, child)
+
+    assert [memo.tick(robot) for i in range(5)] == [RUNNING, RUNNING, FAILURE, FAILURE, FAILURE]
+    assert child.ticks == 3
+
+
+def test_play_mode_switch_resets_previous_subtree():
+    robot   = Robot('BeforeKickOff')
+    kickoff = Leaf(RUNNING)
+    play    = Leaf(SUCCESS)
+    tree    = PlayModeSwitch({'BeforeKickOff': kickoff, 'PlayOn': play})
+
+    assert tree.tick(robot) == RUNNING
+    robot.playmode = 'PlayOn'
+    assert tree.tick(robot) == SUCCESS
+    assert kickoff.resets == 1
+    robot.playmode = 'GameOver'
+    assert tree.tick(robot) == FAILURE
+
+
+def run(robot, cycles):
+    for cycle in range(cycles):
+        robot.step(robot.pns.receive_messages())
+
+
+def test_scheduled_movements_run_in_sequence():
+    model  = robotmodel.load_model()
+    server = KinematicServer(model)
+    robot  = NaoRobot(1, 'test', port=server.port, autostart=False, sync=True)
+    robot.msched.clear()
+
+    tree = Sequence(Schedule('move_hj_to', {'hj': 'hj1', 'angle': 30.0, 'speed': 100}),
+                    Schedule('move_hj_to', {'hj': 'hj2', 'angle': 20.0, 'speed': 100}))
+    robot.set_behaviour(tree)
+    try:
+        run(robot, 10)
+        # the second movement waits for the first one
+        assert robot.hj['hj2'] == pytest.approx(0.0)
+        assert tree.current == 0
+        run(robot, 30)
+    finally:
+        robot.die()
+
+    assert robot.hj['hj1'] == pytest.approx(30.0, abs=0.5)
+    assert robot.hj['hj2'] == pytest.approx(20.0, abs=0.5)
+    assert len(robot.msched) == 0
+
+
+def test_reset_cancels_scheduled_movement():
+    model  = robotmodel.load_model()
+    server = KinematicServer(model)
+    robot  = NaoRobot(1, 'test', port=server.port, autostart=False, sync=True)
+    robot.msched.clear()
+
+    stop  = {'value': False}
+    move  = Schedule('move_hj_to', {'hj': 'hj1', 'angle': 100.0, 'speed': 20})
+    tree  = Selector(Condition(lambda robot: stop['value'], 'stop'), move)
+    robot.set_behaviour(tree)
+    try:
+        run(robot, 5)
+        assert len(robot.msched) == 1
+        stop['value'] = True
+        run(robot, 1)
+        assert len(robot.msched) == 0
+        assert not robot.controller.active[model.index['hj1']]
+        angle = robot.hj['hj1']
+        run(robot, 5)
+    finally:
+        robot.die()
+
+    # the joint was stopped where it was
+    assert 0.0 < angle < 100.0
+    assert robot.hj['hj1'] == pytest.approx(angle, abs=3.0)
+    assert robot.he['he1'] == 0.0
@@ -0,0 +1,55 @@
+import threading
+
+from buffers import DoubleBuffer
+
+
+def test_publish_swaps_buffers():
+    front, back = [0], [0]
+    buffer = DoubleBuffer(front, back)
+
+    buffer.back[0] = 1
+    buffer.publish()
+
+    assert buffer.front is back
+    assert buffer.back  is front
+    assert buffer.read() == [1]
+    assert buffer.get_sequence() == 1
+
+
+def test_read_applies_function():
+    buffer = DoubleBuffer([1, 2], [0, 0])
+    assert buffer.read(sum) == 3
+
+
+def test_readers_see_consistent_buffers():
+    size   = 64
+    buffer = DoubleBuffer([0] * size, [0] * size)
+    stop   = threading.Event()
+    torn   = []
+
+    def write():
+        value = 0
+        while not stop.is_set():
+            value += 1
+            back = buffer.back
+            for i in range(size):
+                back[i] = value
+            buffer.publish()
+
+    def read():
+        for i in range(2000):
+            values = buffer.read()
+            if len(set(values)) != 1:
+                torn.append(values)
+
+    writer  = threading.Thread(target=write)
+    readers = [threading.Thread(target=read) for i in range(4)]
+    writer.start()
+    for reader in readers:
+        reader.start()
+    for reader in readers:
+        reader.join()
+    stop.set()
+    writer.join()
+
+    assert torn == []
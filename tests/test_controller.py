@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+import robotmodel
+import tuning
+from controller import JointController
+
+
+@pytest.fixture
+def model():
+    return robotmodel.load_model()
+
+
+def simulate(controller, angles, cycles, delay=1):
+    """Move the joints by the speeds the controller sends, delay cycles late,
+    and release joints at their target like NaoRobot.move_hj_to()
+    Return the angles of every cycle and the speeds sent."""
+    pending = [np.zeros(len(angles)) for i in range(delay)]
+    history = []
+    rates   = []
+    for cycle in range(cycles):
+        for i in np.flatnonzero(controller.active):
+            if controller.reached(i, angles[i]):
+                controller.release(i)
+        controller.update(angles)
+        pending.append(controller.rate.copy())
+        angles = angles + pending.pop(0)
+        history.append(angles)
+        rates.append(controller.rate.copy())
+    return np.array(history), np.array(rates)
+
+
+def test_nothing_to_control(model):
+    controller = JointController(model)
+    assert len(controller.update(np.zeros(len(model)))) == 0
+
+
+def test_only_changed_joints_are_reported(model):
+    controller = JointController(model)
+    controller.set_target(2, 30.0, 7.0)
+    assert list(controller.update(np.zeros(len(model)))) == [2]
+    assert controller.rate[2] > 0.0
+    assert np.count_nonzero(controller.rate) == 1
+
+
+def test_joint_reaches_target_without_overshoot(model):
+    controller = JointController(model)
+    controller.set_target(0, 80.0, model.maxSpeed[0])
+    angles, rates = simulate(controller, np.zeros(len(model)), 40)
+
+    assert not controller.active[0]
+    assert angles[:, 0].max() <= 80.0 + 0.5
+    assert angles[-1, 0] == pytest.approx(80.0, abs=0.5)
+    assert np.abs(rates[:, 0]).max() <= model.maxSpeed[0]
+    assert np.abs(np.diff(rates[:, 0])).max() <= model.maxAcceleration[0] + 1e-9
+
+
+def test_speed_limit(model):
+    controller = JointController(model)
+    controller.set_target(0, 100.0, 2.0)
+    angles, rates = simulate(controller, np.zeros(len(model)), 10)
+    assert np.abs(rates[:, 0]).max() <= 2.0
+
+
+def test_release_stops_joint(model):
+    controller = JointController(model)
+    controller.set_target(0, 80.0, 7.0)
+    controller.update(np.zeros(len(model)))
+    controller.release(0)
+    assert controller.rate[0] == 0.0
+    assert len(controller.update(np.zeros(len(model)))) == 0
+
+
+def test_calibrate_finds_gain_and_delay(model):
+    rng    = np.random.default_rng(1)
+    rates  = rng.uniform(-5.0, 5.0, (200, len(model)))
+    angles = np.zeros_like(rates)
+    for cycle in range(3, len(rates)):
+        # the speed sent in a cycle shows two cycles later
+        angles[cycle] = angles[cycle-1] + 0.8 * rates[cycle-3]
+
+    controller  = JointController(model)
+    gain, delay = controller.calibrate(angles, rates)
+    assert delay == 2
+    assert gain == pytest.approx(np.full(len(model), 0.8))
+
+
+def test_calibrate_against_kinematic_server():
+    gain, delay = tuning.calibrate(cycles=300, response=(0.8, 2))
+    assert delay == 2
+    assert gain[gain != 1.0] == pytest.approx(0.8, abs=0.01)
+
+
+def test_calibrate_rejects_replayed_log(tmp_path):
+    log = tmp_path / 'episode.log'
+    tuning.calibrate(cycles=50, record=str(log))
+    with pytest.raises(ValueError):
+        tuning.calibrate(log=str(log))
@@ -0,0 +1,155 @@
+import os
+import socket
+import time
+
+import pytest
+
+from faultinjection import Scenario, FaultyTransport
+from simpleAgent import PNS, NaoRobot
+from servers import ScriptedServer, pack
+
+
+SCENARIOS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scenarios')
+
+
+def connect(scenario):
+    """Transport between the scenario and the returned server end"""
+    server, agent = socket.socketpair()
+    agent.settimeout(2.0)
+    return server, scenario(agent)
+
+
+def receive(transport, count):
+    """count messages as delivered to the agent, with their arrival times"""
+    data     = bytearray()
+    chunk    = bytearray(65536)
+    messages = []
+    while len(messages) < count:
+        n = transport.recv_into(chunk)
+        if n == 0:
+            break
+        data += chunk[:n]
+        while len(data) >= 4 and len(data) >= 4 + int.from_bytes(data[:4], 'big'):
+            length = int.from_bytes(data[:4], 'big')
+            messages.append((str(data[4:4+length], 'ASCII'), time.time()))
+            del data[:4+length]
+    return messages
+
+
+def test_phases():
+    scenario = Scenario([{'duration': 1.0, 'drop': 0.5}, {'duration': 2.0, 'burst': 2}])
+    scenario.start = 100.0
+    assert scenario.get_phase(100.5) == {'duration': 1.0, 'drop': 0.5}
+    assert scenario.get_phase(102.9) == {'duration': 2.0, 'burst': 2}
+    assert scenario.get_phase(103.5) == {}
+
+    scenario.repeat = True
+    assert scenario.get_phase(103.5) == {'duration': 1.0, 'drop': 0.5}
+
+
+def test_latency_distributions():
+    scenario = Scenario([], seed=1)
+    assert scenario.sample_latency(None) == 0.0
+    assert scenario.sample_latency({'value': 0.03}) == 0.03
+    assert 0.01 <= scenario.sample_latency({'distribution': 'uniform', 'low': 0.01, 'high': 0.02}) <= 0.02
+    assert scenario.sample_latency({'distribution': 'normal', 'mean': -1.0, 'std': 0.01}) == 0.0
+    assert scenario.sample_latency({'distribution': 'exponential', 'mean': 0.05}) >= 0.0
+    with pytest.raises(ValueError):
+        scenario.sample_latency({'distribution': 'pareto'})
+
+
+def test_load():
+    scenario = Scenario.load(os.path.join(SCENARIOS, 'overloaded_server.json'))
+    assert len(scenario.phases) == 8
+    assert scenario.repeat is False
+
+
+def test_messages_pass_in_order():
+    server, transport = connect(Scenario([]))
+    messages = ['(time (now {:.2f}))'.format(0.02*i) for i in range(20)]
+    server.sendall(b''.join(pack(message) for message in messages))
+    received = receive(transport, 20)
+    transport.close()
+    server.close()
+
+    assert [message for message, arrival in received] == messages
+
+
+def test_latency_and_split():
+    scenario = Scenario([{'duration': 10.0, 'latency': {'value': 0.1},
+                          'partial': 1.0, 'partialDelay': 0.02}])
+    server, transport = connect(scenario)
+    start = time.time()
+    server.sendall(pack('(time (now 0.02))') + pack('(time (now 0.04))'))
+    received = receive(transport, 2)
+    transport.close()
+    server.close()
+
+    assert [message for message, arrival in received] == ['(time (now 0.02))', '(time (now 0.04))']
+    assert received[0][1] - start >= 0.1
+    assert scenario.split == 2
+    assert scenario.delay / 2 >= 0.1
+
+
+def test_burst_and_drop():
+    scenario = Scenario([{'duration': 10.0, 'burst': 3}])
+    server, transport = connect(scenario)
+    server.sendall(pack('one') + pack('two'))
+    transport.settimeout(0.2)
+    with pytest.raises(socket.timeout):
+        receive(transport, 1)
+    server.sendall(pack('three'))
+    transport.settimeout(2.0)
+    assert [message for message, arrival in receive(transport, 3)] == ['one', 'two', 'three']
+    transport.close()
+    server.close()
+
+    scenario = Scenario([{'duration': 10.0, 'drop': 1.0}])
+    server, transport = connect(scenario)
+    server.sendall(pack('lost') * 5)
+    server.close()
+    # the agent sees the connection close, but none of the messages
+    assert receive(transport, 1) == []
+    assert (scenario.messages, scenario.dropped) == (5, 5)
+    transport.close()
+
+
+def test_effectors_go_straight_to_the_server():
+    def script(server, connection):
+        server.receive(connection)
+        server.wait_closed(connection)
+
+    server = ScriptedServer(script)
+    scenario = Scenario([{'duration': 10.0, 'latency': {'value': 0.02}, 'partial': 0.5}], seed=1)
+    pns = PNS(1, 'test', port=server.port, debugLevel=0, sync=True, transport=scenario)
+    assert isinstance(pns.socket, FaultyTransport)
+    assert pns.socket.send_fileno() != pns.socket.fileno()
+
+    pns.receive_message()
+    pns.hinge_joint_effector('he1', 1.0)
+    assert pns.flush_effectors()
+    pns.socket.close()
+    server.join()
+
+    assert server.received[2] == '(he1 1.00)(syn)'
+    assert scenario.messages == 3
+
+
+def test_robot_survives_faults():
+    def script(server, connection):
+        server.send(connection, 50, interval=0.02)
+        server.wait_closed(connection)
+
+    server   = ScriptedServer(script)
+    scenario = Scenario([{'duration': 0.2},
+                         {'duration': 0.4, 'latency': {'distribution': 'uniform', 'low': 0.0, 'high': 0.04},
+                          'burst': 2, 'partial': 0.3},
+                         {'duration': 0.6, 'drop': 0.2}], seed=2)
+    robot    = NaoRobot(1, 'test', port=server.port, transport=scenario, timeout=0.5)
+    time.sleep(1.2)
+    robot.die()
+    server.join()
+
+    assert robot.reconnects == 0
+    assert scenario.dropped > 0
+    assert 30 <= robot.stats.cycles < scenario.messages - scenario.dropped
@@ -0,0 +1,92 @@
+import math
+
+import numpy as np
+import pytest
+
+from localization import (ParticleFilter, LANDMARK_POSITIONS, LEFT, RIGHT,
+                          wrap_angle, local2global)
+from vision import LANDMARKS
+from simpleAgent import NaoRobot
+from servers import ScriptedServer
+
+
+def observe(pose):
+    """Polar coordinates of all landmarks seen from pose (x, y, theta)
+    in the left team's field coordinates, head straight"""
+    polar = np.zeros((len(LANDMARKS), 3))
+    for i, name in enumerate(LANDMARKS):
+        dx = LANDMARK_POSITIONS[name][0] - pose[0]
+        dy = LANDMARK_POSITIONS[name][1] - pose[1]
+        polar[i] = (math.hypot(dx, dy), wrap_angle(math.degrees(math.atan2(dy, dx)) - pose[2]), 0.0)
+    return polar
+
+
+def localize(pose, start, side=LEFT, cycles=20):
+    particles = ParticleFilter(500, *start, seed=1, side=side)
+    visible   = np.ones(len(LANDMARKS), dtype=bool)
+    polar     = observe(pose)
+    for cycle in range(cycles):
+        particles.predict()
+        particles.update(visible, polar)
+    return particles.estimate()
+
+
+def test_converges_to_observed_pose():
+    pose = localize((-5.0, 2.0, 30.0), start=(-5.05, 2.05, 27.0))
+    assert pose[:2] == pytest.approx([-5.0, 2.0], abs=0.15)
+    assert pose[2]  == pytest.approx(30.0, abs=3.0)
+
+
+def test_right_team_localizes_in_its_own_coordinates():
+    # the same spot, seen by the team that plays from right to left:
+    # point reflected at the center, turned by 180 degree
+    pose = localize((5.0, -2.0, -150.0), start=(-5.05, 2.05, 27.0), side=RIGHT)
+    assert pose[:2] == pytest.approx([-5.0, 2.0], abs=0.15)
+    assert pose[2]  == pytest.approx(30.0, abs=3.0)
+
+
+def test_right_landmarks_are_point_reflected():
+    left  = ParticleFilter(10, seed=1)
+    right = ParticleFilter(10, seed=1, side=RIGHT)
+    assert right.landmarks == pytest.approx(-left.landmarks)
+    right.set_side(LEFT)
+    assert right.landmarks == pytest.approx(left.landmarks)
+
+
+def test_unknown_side():
+    with pytest.raises(ValueError):
+        ParticleFilter(side='center')
+
+
+def test_nothing_seen_keeps_weights():
+    particles = ParticleFilter(100, seed=1)
+    weights   = particles.weights.copy()
+    particles.update(np.zeros(len(LANDMARKS), dtype=bool), np.zeros((len(LANDMARKS), 3)))
+    assert particles.weights == pytest.approx(weights)
+
+
+@pytest.mark.parametrize('angle, wrapped', [(0.0, 0.0), (180.0, -180.0), (-180.0, -180.0),
+                                            (270.0, -90.0), (-190.0, 170.0), (720.5, 0.5)])
+def test_wrap_angle(angle, wrapped):
+    assert wrap_angle(angle) == pytest.approx(wrapped)
+
+
+def test_local2global():
+    points = local2global((1.0, 2.0, 90.0), [[1.0, 0.0, 0.5], [0.0, 1.0, 0.0]], headYaw=0.0)
+    assert points == pytest.approx(np.array([[1.0, 3.0, 0.5], [0.0, 2.0, 0.0]]))
+    point  = local2global((0.0, 0.0, 45.0), [1.0, 0.0, 0.0], headYaw=45.0)
+    assert point == pytest.approx(np.array([0.0, 1.0, 0.0]))
+
+
+def test_robot_takes_side_from_game_state():
+    def script(server, connection):
+        server.wait_closed(connection)
+
+    server = ScriptedServer(script)
+    robot  = NaoRobot(1, 'test', port=server.port, autostart=False)
+    robot.perceive(message='(time (now 1.00))(GS (team right) (t 0.00) (pm BeforeKickOff))'
+                           '(See (F1L (pol 3.0 20 0)))')
+    assert robot.gamestate.get_side() == RIGHT
+    assert robot.localization.side == RIGHT
+    robot.die()
+    server.join()
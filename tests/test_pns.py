@@ -0,0 +1,139 @@
+import time
+
+import numpy as np
+import pytest
+
+from simpleAgent import PNS, NaoRobot, ConnectionClosed, ServerTimeout
+from servers import ScriptedServer, pack
+
+
+def connect(server, **options):
+    pns = PNS(1, 'test', port=server.port, debugLevel=0, **options)
+    pns.receive_message() # second frame after init
+    return pns
+
+
+def test_messages_are_framed():
+    messages = ['(time (now 1.00))', '(time (now 1.02))', '(time (now 1.04))(GS (t 0.00))']
+
+    def script(server, connection):
+        # two messages in one segment, the third one in pieces
+        connection.sendall(pack(messages[0]) + pack(messages[1]))
+        third = pack(messages[2])
+        for piece in (third[:2], third[2:9], third[9:]):
+            connection.sendall(piece)
+            time.sleep(0.01)
+        server.wait_closed(connection)
+
+    server = ScriptedServer(script)
+    pns    = connect(server)
+    received = []
+    while len(received) < 3:
+        received += pns.receive_messages()
+    pns.socket.close()
+    server.join()
+
+    assert received == messages
+
+
+def test_effectors_are_batched():
+    def script(server, connection):
+        server.receive(connection)
+        server.receive(connection)
+
+    server = ScriptedServer(script)
+    pns    = connect(server, sync=True)
+    pns.hinge_joint_effector('he1', 1.0)
+    pns.hinge_joint_effector('he2', 3.0)
+    pns.hinge_joint_effector('he1', 2.0)
+    assert pns.flush_effectors()
+    assert pns.flush_effectors()
+    server.join()
+    pns.socket.close()
+
+    # scene and init, then one frame with the latest command of every effector
+    assert server.received[2:] == ['(he1 2.00)(he2 3.00)(syn)', '(syn)']
+
+
+def test_timeout_keeps_connection():
+    def script(server, connection):
+        time.sleep(0.3)
+        server.send(connection)
+        server.wait_closed(connection)
+
+    server = ScriptedServer(script)
+    pns    = connect(server, timeout=0.1)
+    timeouts = 0
+    while True:
+        try:
+            message = pns.receive_message()
+            break
+        except ServerTimeout:
+            timeouts += 1
+    assert timeouts >= 2
+    assert message.startswith('(time')
+    pns.socket.close()
+    server.join()
+
+
+def test_reconnect():
+    def close(server, connection):
+        pass
+
+    def serve(server, connection):
+        server.send(connection)
+        server.wait_closed(connection)
+
+    server = ScriptedServer(close, serve)
+    pns    = connect(server)
+    with pytest.raises(ConnectionClosed):
+        pns.receive_message()
+
+    pns.hinge_joint_effector('he1', 1.0)
+    pns.reconnect()
+    pns.receive_message()
+    assert pns.receive_message().startswith('(time')
+    assert pns.effectors == {}
+    assert pns.connectAttempts == 2
+    pns.socket.close()
+    server.join()
+
+    assert [message.split()[0] for message in server.received] == ['(scene', '(init'] * 2
+
+
+def test_slow_cycle_does_not_reconnect():
+    def script(server, connection):
+        server.send(connection, 10, interval=0.02)
+        time.sleep(0.35)
+        server.send(connection, 10, interval=0.02)
+        server.wait_closed(connection)
+
+    server = ScriptedServer(script)
+    robot  = NaoRobot(1, 'test', port=server.port, timeout=0.1)
+    time.sleep(1.0)
+    robot.die()
+    server.join()
+
+    assert robot.reconnects == 0
+    assert robot.stats.cycles >= 15
+
+
+def test_reconnect_resets_pose():
+    def close(server, connection):
+        server.send(connection, 5, interval=0.02)
+
+    def serve(server, connection):
+        server.send(connection, 10, interval=0.02)
+        server.wait_closed(connection)
+
+    server = ScriptedServer(close, serve)
+    robot  = NaoRobot(1, 'test', port=server.port, startCoordinates=[-1.0, 2.0, 30.0],
+            autostart=False)
+    robot.localization.reset(5.0, 5.0, 90.0)
+    robot.start()
+    time.sleep(0.8)
+    robot.die()
+    server.join()
+
+    assert robot.reconnects == 1
+    assert np.allclose(robot.get_pose(), (-1.0, 2.0, 30.0), atol=0.5)
@@ -0,0 +1,116 @@
+import gc
+import time
+import tracemalloc
+
+import robotmodel
+from agentloop import AgentLoop
+from profiling import AllocationProfiler, IdleCollector
+from simpleAgent import NaoRobot
+from tuning import KinematicServer
+
+
+class Allocating(object):
+    """Stand-in robot whose step keeps what it allocates"""
+
+    def __init__(self):
+        self.kept = []
+
+    def step(self):
+        self.kept.append(bytearray(10000))
+
+    def perceive(self):
+        pass
+
+    def control(self):
+        pass
+
+    def communicate(self):
+        pass
+
+
+def test_kept_allocations_are_counted():
+    robot    = Allocating()
+    profiler = AllocationProfiler(robot)
+    for attr in ('pns', 'reflexes', 'behaviour', 'msched'):
+        setattr(robot, attr, None)
+    profiler.attach()
+    for i in range(10):
+        robot.step()
+        robot.perceive()
+    profiler.detach()
+
+    calls, peak, net, blocks = profiler.stats['step']
+    assert calls == 10
+    assert net / calls >= 10000
+    assert abs(profiler.stats['perceive'][2] / 10) < 1000
+    assert 'step' not in vars(robot)
+    assert not tracemalloc.is_tracing()
+
+
+def test_loop_reports_profile_of_robots(capsys):
+    model  = robotmodel.load_model()
+    server = KinematicServer(model, realtime=True)
+    robot  = NaoRobot(1, 'test', port=server.port, autostart=False, profile=True)
+
+    AgentLoop([robot]).run(duration=0.3)
+    robot.die()
+
+    steps = robot.profiler.stats['step'][0]
+    assert steps >= 2
+    assert robot.profiler.stats['receive'][0] == steps
+    assert robot.profiler.stats['flush'][0] == steps
+    assert robot.profiler.stats['perceive'][0] >= robot.stats.cycles
+    assert 'step' not in vars(robot)
+    assert not tracemalloc.is_tracing()
+    output = capsys.readouterr().out
+    assert "Robot 1 allocations per stage" in output
+    assert "flush" in output
+
+
+def test_profilers_share_tracing():
+    first  = AllocationProfiler(Allocating())
+    second = AllocationProfiler(Allocating())
+    for profiler in (first, second):
+        for attr in ('pns', 'reflexes', 'behaviour', 'msched'):
+            setattr(profiler.robot, attr, None)
+        profiler.attach()
+    first.detach()
+    assert tracemalloc.is_tracing()
+    second.detach()
+    assert not tracemalloc.is_tracing()
+
+
+def test_idle_collector_runs_the_collector_when_due():
+    collector = IdleCollector(freeze=False)
+    threshold = gc.get_threshold()
+    collector.start()
+    try:
+        assert not gc.isenabled()
+        assert collector.idle() == 0 or sum(collector.collections) == 1
+
+        gc.set_threshold(10, threshold[1], threshold[2])
+        garbage = []
+        for i in range(100):
+            cycle = [];  cycle.append(cycle)
+            garbage.append(cycle)
+        del garbage, cycle
+        assert collector.idle() >= 100
+        assert sum(collector.collections) >= 1
+    finally:
+        gc.set_threshold(*threshold)
+        collector.stop()
+
+    assert gc.isenabled()
+    assert collector.idle() == 0
+
+
+def test_living_robot_reports_profile_when_it_dies(capsys):
+    model  = robotmodel.load_model()
+    server = KinematicServer(model, realtime=True)
+    robot  = NaoRobot(1, 'test', port=server.port, profile=True)
+    time.sleep(0.3)
+    robot.die()
+
+    assert robot.profiler.stats['step'][0] >= 2
+    assert "Robot 1 allocations per stage" in capsys.readouterr().out
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,102 @@
+import pytest
+
+import robotmodel
+from simpleAgent import NaoRobot, Gyroscope, Accelerometer
+from reflex import FallDetector, UPRIGHT, FRONT, BACK, SIDE, GRAVITY, GETUP_FROM_FRONT
+from behaviour import Sequence, Schedule
+from tuning import KinematicServer
+
+
+def sensors(acceleration):
+    """Torso sensors of a robot at rest that measure acceleration,
+    the reaction to gravity in the torso frame"""
+    acc = Accelerometer('torso')
+    acc.set(acceleration)
+    return acc, Gyroscope('torso')
+
+
+def test_upright():
+    detector = FallDetector()
+    for cycle in range(5):
+        assert detector.update(*sensors((0.0, 0.0, GRAVITY))) == UPRIGHT
+
+
+@pytest.mark.parametrize('acceleration, posture', [((-GRAVITY, 0.0, 0.0), FRONT),
+                                                   (( GRAVITY, 0.0, 0.0), BACK),
+                                                   ((0.0,  GRAVITY, 0.0), SIDE),
+                                                   ((0.0, -GRAVITY, 0.0), SIDE)])
+def test_lying(acceleration, posture):
+    detector = FallDetector(confirmCycles=2)
+    assert detector.update(*sensors(acceleration)) == UPRIGHT
+    assert detector.update(*sensors(acceleration)) == posture
+
+
+def test_short_tilt_is_ignored():
+    detector = FallDetector(confirmCycles=3)
+    for cycle in range(2):
+        detector.update(*sensors((-GRAVITY, 0.0, 0.0)))
+    assert detector.update(*sensors((0.0, 0.0, GRAVITY))) == UPRIGHT
+    assert detector.update(*sensors((-GRAVITY, 0.0, 0.0))) == UPRIGHT
+
+
+def test_threshold():
+    # tilted by 45 degree
+    tilted = (-GRAVITY / 2**0.5, 0.0, GRAVITY / 2**0.5)
+    assert FallDetector(threshold=60.0, confirmCycles=1).update(*sensors(tilted)) == UPRIGHT
+    assert FallDetector(threshold=30.0, confirmCycles=1).update(*sensors(tilted)) == FRONT
+
+
+def test_gyroscope_is_used_in_free_fall():
+    detector = FallDetector(confirmCycles=1)
+    acc, gyr = sensors((0.0, 0.0, 0.0))
+    assert detector.update(acc, gyr) == UPRIGHT
+
+    # integrated orientation says the robot is lying on its back
+    gyr.x[:] = (0.0, 0.0, 1.0)
+    gyr.z[:] = (-1.0, 0.0, 0.0)
+    assert detector.update(acc, gyr) == BACK
+
+
+def test_reset():
+    detector = FallDetector(confirmCycles=1)
+    detector.update(*sensors((-GRAVITY, 0.0, 0.0)))
+    detector.reset()
+    assert detector.posture == UPRIGHT
+    assert detector.tiltedCycles == 0
+
+
+class LyingServer(KinematicServer):
+    """Kinematic server whose robot lies on its belly"""
+
+    def frame(self):
+        return super().frame().replace('(a 0.00 0.00 {:.2f})'.format(GRAVITY),
+                                       '(a {:.2f} 0.00 0.00)'.format(-GRAVITY))
+
+
+def test_behaviour_does_not_disturb_get_up():
+    model  = robotmodel.load_model()
+    server = LyingServer(model)
+    robot  = NaoRobot(1, 'test', port=server.port, autostart=False, sync=True)
+    robot.msched.clear()
+
+    # competes for joints of the get-up motion
+    robot.set_behaviour(Sequence(Schedule('move_hj_to', {'hj': 'raj1', 'angle':  50.0, 'speed': 100}),
+                                 Schedule('move_hj_to', {'hj': 'rlj3', 'angle': -20.0, 'speed': 100})))
+    keyframes = {hj: {0.0} for hj in ('rlj3', 'raj1')}
+    for frame, cycles in GETUP_FROM_FRONT:
+        for hj in keyframes:
+            if hj in frame:
+                keyframes[hj].add(frame[hj])
+
+    try:
+        active = 0
+        for cycle in range(60):
+            robot.step(robot.pns.receive_messages())
+            if robot.reflexes.is_active():
+                active += 1
+                for hj, angles in keyframes.items():
+                    assert robot.controller.target[model.index[hj]] in angles
+    finally:
+        robot.die()
+
+    assert active > 50
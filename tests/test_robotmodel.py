@@ -0,0 +1,94 @@
+import copy
+
+import pytest
+
+from robotmodel import RobotModel, load_model
+from simpleAgent import NaoRobot
+from servers import ScriptedServer
+
+
+DESCRIPTOR = {'name': 'test', 'scene': 'test.rsg', 'maxhjSpeed': 7.0, 'maxhjAcceleration': 3.5,
+              'joints': [{'perceptor': 'hj1', 'effector': 'he1', 'min': -120.0, 'max': 120.0},
+                         {'perceptor': 'hj2', 'effector': 'he2', 'min':  -45.0, 'max':  45.0}],
+              'types': {'1': {'scene': 'test.rsg 1', 'maxhjSpeed': 5.0,
+                              'joints': [{'perceptor': 'hj2', 'min': -30.0, 'maxSpeed': 2.0},
+                                         {'perceptor': 'tj1', 'effector': 'te1',
+                                          'min': -1.0, 'max': 70.0}]}}}
+
+
+def test_joints_are_indexed_in_descriptor_order():
+    model = RobotModel(DESCRIPTOR)
+    assert model.perceptors == ('hj1', 'hj2')
+    assert model.effectorOf == {'hj1': 'he1', 'hj2': 'he2'}
+    assert model.hjMin.tolist() == [-120.0, -45.0]
+    assert model.maxSpeed.tolist() == [7.0, 7.0]
+    with pytest.raises(ValueError):
+        model.hjMax[0] = 0.0
+
+
+def test_player_type_overrides_and_adds_joints():
+    model = RobotModel(DESCRIPTOR, playerType=1)
+    assert model.scene == 'test.rsg 1'
+    assert model.perceptors == ('hj1', 'hj2', 'tj1')
+    assert model.hjMin.tolist() == [-120.0, -30.0, -1.0]
+    assert model.hjMax.tolist() == [120.0, 45.0, 70.0]
+    assert model.maxSpeed.tolist() == [5.0, 2.0, 5.0]
+    assert model.maxAcceleration.tolist() == [3.5, 3.5, 3.5]
+    # the standard robot is not affected by the merge
+    assert len(RobotModel(DESCRIPTOR)) == 2
+
+
+def test_unknown_player_type():
+    with pytest.raises(KeyError):
+        RobotModel(DESCRIPTOR, playerType=7)
+
+
+def test_joint_array():
+    model  = RobotModel(DESCRIPTOR)
+    joints = model.joint_array()
+    joints['hj2'] = 10.0
+    assert joints.values.tolist() == [0.0, 10.0]
+    assert dict(joints.items()) == {'hj1': 0.0, 'hj2': 10.0}
+    assert 'hj1' in joints and 'he1' not in joints
+
+    with pytest.raises(KeyError):
+        joints['tj1']
+    with pytest.raises(KeyError):
+        joints['tj1'] = 1.0
+
+    other = copy.deepcopy(joints)
+    other['hj1'] = 5.0
+    assert joints['hj1'] == 0.0
+    assert other.index is joints.index
+
+
+def test_models_are_compiled_once():
+    assert load_model('nao') is load_model('nao')
+    assert load_model('nao', 4) is not load_model('nao')
+
+
+def test_player_type_reaches_the_server():
+    def script(server, connection):
+        server.wait_closed(connection)
+
+    server = ScriptedServer(script)
+    robot  = NaoRobot(1, 'test', port=server.port, playerType=4, autostart=False)
+    robot.perceive(message='(time (now 1.00))(HJ (n rlj7) (ax 12.50))')
+    assert robot.hj['rlj7'] == 12.5
+    assert len(robot.model) == len(load_model('nao')) + 2
+    robot.die()
+    server.join()
+
+    assert server.received[0] == '(scene rsg/agent/nao/nao_hetero.rsg 4)'
+
+
+def test_unknown_joint_is_rejected():
+    def script(server, connection):
+        server.wait_closed(connection)
+
+    server = ScriptedServer(script)
+    robot  = NaoRobot(1, 'test', port=server.port, autostart=False)
+    with pytest.raises(KeyError):
+        robot.perceive(message='(time (now 1.00))(HJ (n rlj7) (ax 12.50))')
+    robot.die()
+    server.join()
@@ -0,0 +1,67 @@
+import robotmodel
+from startup import start_team
+from tuning import KinematicServer
+from servers import ScriptedServer
+
+
+def test_all_agents_start():
+    model   = robotmodel.load_model()
+    servers = {agentID: KinematicServer(model, realtime=True) for agentID in (1, 2, 3)}
+    ready   = []
+
+    # one server per agent, the port is the only option that differs
+    statuses = {}
+    for agentID, server in servers.items():
+        statuses.update(start_team('test', [agentID], port=server.port, autostart=False,
+                callback=ready.append))
+
+    assert all(status.is_ready() for status in statuses.values())
+    assert sorted(status.agentID for status in ready) == [1, 2, 3]
+    for status in statuses.values():
+        assert status.attempts == 1
+        assert status.elapsed >= 0.0
+        status.robot.die()
+
+
+def test_refused_connections_are_counted():
+    statuses = start_team('test', [4, 5], port=1, connectRetries=2, connectBackoff=0.01)
+    for status in statuses.values():
+        assert not status.is_ready()
+        assert isinstance(status.error, OSError)
+        assert status.attempts == 3
+
+
+def test_stalled_handshake_is_retried():
+    def stall(server, connection):
+        # receive scene, never answer
+        server.receive(connection)
+        server.wait_closed(connection)
+    stall.handshake = True
+
+    def serve(server, connection):
+        server.wait_closed(connection)
+
+    server   = ScriptedServer(stall, serve)
+    statuses = start_team('test', [1], port=server.port, timeout=0.2, autostart=False)
+    status   = statuses[1]
+    assert status.is_ready()
+    assert status.attempts == 2
+    status.robot.die()
+    server.join()
+
+
+def test_failed_agent_closes_its_connection():
+    closed = []
+
+    def answer_handshake_only(server, connection):
+        server.handshake(connection, frames=1)
+        closed.append(server.wait_closed(connection, timeout=2.0))
+    answer_handshake_only.handshake = True
+
+    server   = ScriptedServer(answer_handshake_only)
+    statuses = start_team('test', [1], port=server.port, timeout=0.2, connectRetries=0,
+            autostart=False)
+    server.join()
+
+    assert not statuses[1].is_ready()
+    assert closed == [True]
@@ -0,0 +1,131 @@
+import pytest
+
+from teamcomm import TeamComm, TeamMessage, ALPHABET, MSGLENGTH, FIELDS
+from worldmodel import TeamWorldModel
+
+
+CYCLEMODULUS = 2**FIELDS[2][1]
+
+
+@pytest.fixture
+def comm():
+    return TeamComm(3, 'home')
+
+
+def message(**fields):
+    defaults = dict(unum=3, role=2, cycle=1234, x=-3.25, y=4.5, theta=45.0,
+                    ballX=1.125, ballY=-2.75, ballAge=17, fallen=False)
+    defaults.update(fields)
+    return TeamMessage(**defaults)
+
+
+def test_round_trip(comm):
+    sent     = message()
+    received = comm.decode(comm.encode(sent), 1234)
+
+    assert received.unum    == 3
+    assert received.role    == 2
+    assert received.cycle   == 1234
+    assert received.x       == pytest.approx(-3.25, abs=0.001)
+    assert received.y       == pytest.approx(4.5,   abs=0.001)
+    assert received.theta   == pytest.approx(45.0,  abs=0.5)
+    assert received.ballX   == pytest.approx(1.125, abs=0.001)
+    assert received.ballY   == pytest.approx(-2.75, abs=0.001)
+    assert received.ballAge == 17
+    assert received.fallen is False
+
+
+def test_encoded_message_fits_say_effector(comm):
+    string = comm.encode(message())
+    assert len(string) == MSGLENGTH
+    assert string[0].isalpha()
+    assert all(c in ALPHABET for c in string)
+
+
+def test_maximum_field_values():
+    # a team of 15 uses all player numbers the field holds
+    comm = TeamComm(3, 'home', nplayers=15)
+    sent = message(unum=15, role=15, cycle=CYCLEMODULUS - 1, x=16.767, y=21.767,
+                   ballX=16.767, ballY=21.767, ballAge=TeamMessage.MAXBALLAGE, fallen=True)
+    received = comm.decode(comm.encode(sent))
+
+    assert received.unum    == 15
+    assert received.role    == 15
+    assert received.cycle   == CYCLEMODULUS - 1
+    assert received.x       == pytest.approx(16.767, abs=0.001)
+    assert received.ballY   == pytest.approx(21.767, abs=0.001)
+    assert received.ballAge == TeamMessage.MAXBALLAGE
+    assert received.fallen is True
+
+
+def test_values_out_of_range_are_clamped(comm):
+    received = comm.decode(comm.encode(message(x=100.0, y=-100.0)))
+    assert received.x == pytest.approx(16.767, abs=0.001)
+    assert received.y == pytest.approx(-11.0,  abs=0.001)
+
+
+@pytest.mark.parametrize('theta', [-180.0, -90.0, -0.5, 0.0, 90.0, 179.5, 270.0, -450.0])
+def test_theta_is_decoded_into_half_open_interval(comm, theta):
+    received = comm.decode(comm.encode(message(theta=theta)))
+    assert -180.0 <= received.theta < 180.0
+    assert (received.theta - theta) % 360.0 == pytest.approx(0.0, abs=0.5)
+
+
+def test_foreign_team_is_rejected(comm):
+    foreign = TeamComm(3, 'away').encode(message())
+    assert comm.decode(foreign) is None
+
+    # even with the own team tag, the salted checksum does not match
+    assert comm.decode(comm.tag + foreign[1:]) is None
+
+
+def test_corrupted_message_is_rejected(comm):
+    string = comm.encode(message())
+    for i in range(1, MSGLENGTH):
+        digit     = ALPHABET.index(string[i])
+        corrupted = string[:i] + ALPHABET[(digit + 1) % len(ALPHABET)] + string[i+1:]
+        assert comm.decode(corrupted) is None
+
+
+@pytest.mark.parametrize('string', [None, '', 'A', 'A' * (MSGLENGTH + 1), 'A' + ' ' * (MSGLENGTH - 1)])
+def test_malformed_message_is_rejected(comm, string):
+    assert comm.decode(string) is None
+
+
+def test_cycle_is_expanded_around_wraparound(comm):
+    sent = CYCLEMODULUS + 5
+    assert comm.decode(comm.encode(message(cycle=sent)), sent + 10).cycle == sent
+
+    # sent just before the counter wrapped, heard just after
+    sent = 3*CYCLEMODULUS - 2
+    assert comm.decode(comm.encode(message(cycle=sent)), sent + 3).cycle == sent
+
+
+def test_receive(comm):
+    string = comm.encode(message(unum=7))
+
+    assert comm.receive(['hear', 1.0, 'self', string]) is None
+    assert comm.receive(['hear', 1.0, 30.0, string], 1234).unum == 7
+    received = comm.receive(['hear', 'home', 1.0, -45.0, string], 1234)
+    assert received.direction == -45.0
+    assert comm.get_messages()[7] is received
+
+
+def test_players_take_turns():
+    comms = [TeamComm(unum, 'home') for unum in range(1, 12)]
+    for cycle in range(100):
+        speakers = [comm.unum for comm in comms if comm.should_say(cycle)]
+        assert len(speakers) == (1 if cycle % 2 == 0 else 0)
+
+
+@pytest.mark.parametrize('unum', [0, 12, 15])
+def test_unknown_player_number_is_rejected(comm, unum):
+    assert comm.decode(comm.encode(message(unum=unum))) is None
+
+
+def test_report_checks_player_number():
+    model = TeamWorldModel()
+    with pytest.raises(ValueError):
+        model.report(0, 1.0, pose=(0.0, 0.0, 0.0))
+    model.report(11, 1.0, pose=(1.0, 2.0, 3.0))
+    assert model.get_state().teammates[10] == pytest.approx([1.0, 2.0, 3.0])
@@ -0,0 +1,133 @@
+import numpy as np
+import pytest
+
+import robotmodel
+import tuning
+from simpleAgent import PNS
+from tuning import KinematicServer, LogServer
+
+
+@pytest.fixture
+def model():
+    return robotmodel.load_model()
+
+
+def angle(message, hj):
+    return float(message.split('(HJ (n {}) (ax '.format(hj))[1].split(')')[0])
+
+
+def test_kinematic_server_applies_delayed_speeds(model):
+    server = KinematicServer(model, gain=0.5, delay=2)
+    pns    = PNS(1, 'test', port=server.port, debugLevel=0, sync=True)
+    pns.receive_message() # second frame after init
+
+    angles = []
+    pns.hinge_joint_effector('he1', 4.0)
+    for cycle in range(4):
+        pns.flush_effectors()
+        angles.append(angle(pns.receive_message(), 'hj1'))
+    pns.socket.close()
+
+    # gain 0.5 of 4 degree/cycle, from the second frame after the speed was sent
+    assert angles == pytest.approx([0.0, 0.0, 2.0, 4.0])
+
+
+def test_kinematic_server_keeps_joint_limits(model):
+    server = KinematicServer(model)
+    pns    = PNS(1, 'test', port=server.port, debugLevel=0, sync=True)
+    pns.receive_message()
+
+    pns.hinge_joint_effector('he2', 100.0)
+    for cycle in range(20):
+        pns.flush_effectors()
+        message = pns.receive_message()
+    pns.socket.close()
+
+    assert angle(message, 'hj2') == pytest.approx(model.hjMax[model.index['hj2']])
+
+
+def test_episode_is_reproducible():
+    first  = tuning.run_episode({'kp': 0.7}, seed=3, cycles=300, moves=3)
+    second = tuning.run_episode({'kp': 0.7}, seed=3, cycles=300, moves=3)
+
+    assert first['completed'] == 3
+    assert first['timeouts'] == 0
+    assert first['error'] < 0.5
+    for name in ('cycles', 'completed', 'moveCycles', 'error', 'overshoot'):
+        assert first[name] == pytest.approx(second[name])
+
+
+def test_apply_parameters(model):
+    class Robot(object):
+        def __init__(self):
+            self.controller = tuning.JointController(model)
+            self.maxhjSpeed = 7.0
+
+    robot = Robot()
+    tuning.apply_parameters(robot, {'kp': 0.5, 'accuracy': 0.2, 'maxhjSpeed': 5.0})
+    assert np.all(robot.controller.kp == 0.5)
+    assert robot.controller.accuracy == 0.2
+    assert robot.maxhjSpeed == 5.0
+    with pytest.raises(AttributeError):
+        tuning.apply_parameters(robot, {'unknown': 1.0})
+
+
+def test_grid():
+    candidates = list(tuning.grid({'b': [1, 2], 'a': [3]}))
+    assert candidates == [{'a': 3, 'b': 1}, {'a': 3, 'b': 2}]
+
+
+def test_random_search():
+    space   = {'kp': (0.3, 1.0), 'delay': [1, 2]}
+    samples = list(tuning.random_search(space, 20, seed=1))
+    assert len(samples) == 20
+    assert all(0.3 <= sample['kp'] <= 1.0 for sample in samples)
+    assert {sample['delay'] for sample in samples} == {1, 2}
+    assert samples == list(tuning.random_search(space, 20, seed=1))
+
+
+def test_tune_stores_columns(tmp_path, capsys):
+    output     = str(tmp_path / 'results.npz')
+    candidates = [{'kp': 0.5}, {'kp': 0.9}]
+    columns    = tuning.tune(candidates, episodes=2, workers=2, output=output,
+            cycles=100, moves=1)
+
+    stored = tuning.load_results(output)
+    assert sorted(stored) == sorted(columns)
+    assert stored['kp'].tolist() == [0.5, 0.5, 0.9, 0.9]
+    assert stored['seed'].tolist() == [0, 1, 0, 1]
+
+    tuning.summarize(stored, ['kp'])
+    assert "cycles/move" in capsys.readouterr().out
+
+
+def test_log_round_trip(tmp_path):
+    path     = str(tmp_path / 'episode.log')
+    messages = ['(time (now 0.02))', '(time (now 0.04))(GS (t 0.04))']
+    tuning.write_log(path, messages[:1])
+    tuning.write_log(path, messages[1:])
+    assert tuning.read_log(path) == messages
+
+
+def test_log_server_replays_recorded_angles(tmp_path, model):
+    path     = str(tmp_path / 'episode.log')
+    recorder = tuning.Recorder()
+    tuning.run_episode({}, seed=1, cycles=60, moves=1, recorder=recorder)
+    tuning.write_log(path, recorder.messages)
+
+    server = LogServer(model, path)
+    pns    = PNS(1, 'test', port=server.port, debugLevel=0, sync=True)
+    # scene and init are answered with the first three messages,
+    # the handshake reads the first two
+    replayed = [pns.receive_message()]
+    # effectors do not change what was recorded
+    pns.hinge_joint_effector('he1', 7.0)
+    while True:
+        pns.flush_effectors()
+        try:
+            replayed.append(pns.receive_message())
+        except OSError:
+            break
+    pns.socket.close()
+
+    assert replayed == recorder.messages[2:]
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from vision import Vision, polar2cartesian, BALL, LANDMARK, TEAMMATE, OPPONENT
+
+
+def test_polar2cartesian():
+    polar = [[1.0,   0.0,  0.0],
+             [2.0,  90.0,  0.0],
+             [3.0,   0.0, 90.0],
+             [2.0, 180.0, 30.0]]
+    expected = [[1.0, 0.0, 0.0],
+                [0.0, 2.0, 0.0],
+                [0.0, 0.0, 3.0],
+                [-np.sqrt(3.0), 0.0, 1.0]]
+    assert polar2cartesian(polar) == pytest.approx(np.array(expected))
+
+
+def test_polar2cartesian_into_out():
+    out    = np.zeros((2, 3))
+    result = polar2cartesian([[1.0, 0.0, 0.0], [1.0, -90.0, 0.0]], out=out)
+    assert result is out
+    assert out == pytest.approx(np.array([[1.0, 0.0, 0.0], [0.0, -1.0, 0.0]]))
+
+
+@pytest.fixture
+def vision():
+    vision = Vision('home')
+    vision.update([['B',   ['pol', 1.0,   0.0, 0.0]],
+                   ['F1L', ['pol', 5.0,  30.0, 0.0]],
+                   ['G2R', ['pol', 3.0, -30.0, 0.0]],
+                   ['P', ['team', 'home'], ['id', 4], ['head', ['pol', 2.0,  90.0, 0.0]]],
+                   ['P', ['team', 'away'], ['id', 9], ['head', ['pol', 4.0, -90.0, 0.0]]]])
+    return vision
+
+
+def test_nearest(vision):
+    kind, id, position, distance = vision.index.nearest()
+    assert kind == BALL
+    assert distance == pytest.approx(1.0)
+
+    kind, id, position, distance = vision.index.nearest(kind=LANDMARK)
+    assert id == 7 # G2R
+    assert position == pytest.approx(np.array([3.0 * np.cos(np.radians(30.0)),
+                                               -3.0 * np.sin(np.radians(30.0)), 0.0]))
+
+    kind, id, position, distance = vision.index.nearest(point=(0.0, -4.0, 0.0))
+    assert (kind, id) == (OPPONENT, 9)
+
+    assert vision.index.nearest(kind=TEAMMATE)[1] == 4
+
+
+def test_within(vision):
+    kinds, ids, positions = vision.index.within(2.5)
+    assert list(kinds) == [BALL, TEAMMATE]
+
+    kinds, ids, positions = vision.index.within(10.0, kind=LANDMARK)
+    assert list(ids) == [7, 0]
+
+
+def test_nothing_seen():
+    vision = Vision('home')
+    vision.update([])
+    assert vision.index.nearest() is None
+    assert len(vision.index.within(100.0)[0]) == 0
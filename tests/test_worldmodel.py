@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from worldmodel import TeamWorldModel
+from teamcomm import TeamComm, TeamMessage
+from simpleAgent import NaoRobot
+from servers import ScriptedServer
+
+
+def test_ball_is_weighted_by_confidence_and_age():
+    model = TeamWorldModel(nplayers=3, halfLife=1.0)
+    model.report(1, 10.0, ball=(2.0, 0.0), ballConfidence=1.0)
+    model.report(2, 11.0, ball=(4.0, 0.0), ballConfidence=0.5)
+    state = model.get_state()
+
+    # the first observation is one half life old by now
+    assert state.ballConfidence == pytest.approx(1.0)
+    assert state.ball == pytest.approx([3.0, 0.0])
+    assert state.time == 11.0
+
+
+def test_older_observations_are_ignored():
+    model = TeamWorldModel(nplayers=3)
+    model.report(2, 5.0, pose=(1.0, 1.0, 0.0), ball=(1.0, 2.0))
+    model.report(2, 4.0, pose=(9.0, 9.0, 0.0), ball=(9.0, 9.0))
+    state = model.get_state()
+
+    assert state.teammates[1] == pytest.approx([1.0, 1.0, 0.0])
+    assert state.ball == pytest.approx([1.0, 2.0])
+    assert state.teammateConfidence[0] == 0.0
+
+
+def test_opponents_are_fused_per_player():
+    model = TeamWorldModel(nplayers=3)
+    model.report(1, 1.0, opponentIDs=(2,), opponents=[(1.0, 1.0, 0.0)])
+    model.report(3, 1.0, opponentIDs=(2, 7), opponents=[(3.0, 1.0, 0.0), (5.0, 5.0, 0.0)])
+    state = model.get_state()
+
+    assert state.opponents[1] == pytest.approx([2.0, 1.0])
+    assert state.opponentConfidence == pytest.approx([0.0, 2.0, 0.0])
+
+
+def idle(server, connection):
+    server.wait_closed(connection)
+
+
+def test_robot_falls_back_to_the_team_ball():
+    model  = TeamWorldModel()
+    server = ScriptedServer(idle)
+    robot  = NaoRobot(1, 'test', port=server.port, worldmodel=model, autostart=False)
+
+    # a team mate reports the ball, then this robot sees it in front of itself
+    model.report(2, 1.0, ball=(4.0, -1.0))
+    robot.perceive(message='(time (now 1.00))(GS (t 1.00) (pm PlayOn))')
+    assert robot.get_ball() == pytest.approx([4.0, -1.0])
+    assert robot.get_state().teamBall == pytest.approx([4.0, -1.0])
+
+    robot.perceive(message='(time (now 1.02))(GS (t 1.02) (pm PlayOn))'
+                           '(See (B (pol 1.0 0 0)))')
+    own = robot.get_ball()
+    assert own == pytest.approx(robot.get_pose()[:2] + [1.0, 0.0], abs=0.1)
+
+    # once the own sighting is too old, the fused ball takes over
+    for cycle in range(robot.ballMemory + 1):
+        now = 1.04 + 0.02*cycle
+        robot.perceive(message='(time (now {0:.2f}))(GS (t {0:.2f}) (pm PlayOn))'.format(now))
+    fused = robot.get_ball()
+    assert not np.allclose(fused, own)
+    assert fused == pytest.approx(robot.get_state().teamBall)
+
+    robot.die()
+    server.join()
+
+
+def test_heard_ball_reaches_the_robot():
+    server = ScriptedServer(idle)
+    robot  = NaoRobot(1, 'test', port=server.port, worldmodel=TeamWorldModel(), autostart=False)
+    assert robot.get_ball() is None
+
+    said = TeamComm(3, 'test').encode(TeamMessage(unum=3, cycle=50, x=1.0, y=1.0,
+            ballX=-2.0, ballY=3.0, ballAge=0))
+    robot.perceive(message='(time (now 1.00))(GS (t 1.00) (pm PlayOn))'
+                           '(hear 1.00 -30 {})'.format(said))
+    assert robot.get_ball() == pytest.approx([-2.0, 3.0], abs=0.1)
+
+    robot.die()
+    server.join()
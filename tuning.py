@@ -0,0 +1,476 @@
+#! /usr/bin/env python3
+"""Tune agent parameters offline in many headless episodes.
+Every episode runs one NaoRobot against a local stand-in of the simulation
+server, either a kinematic model of the joints or a recorded perceptor log.
+Parameter sets come from a grid or from random search, episodes run in a
+pool of processes, and the results are stored column by column in a
+compressed .npz file, one row per episode.
+With --calibrate, one episode is run first, e.g. against the simulation
+server given by --server, to fit the gain and delay of the joints, see
+JointController.calibrate(). The kinematic model and the JointController
+of all episodes then use the fitted values. --record keeps the perceptor
+messages of that episode as a log for --log, which cannot be calibrated
+against itself, as a replay ignores the effectors.
+
+usage: tuning.py [--grid] [--samples N] [--episodes N] [--cycles N]
+                 [--workers N] [--log FILE] [--realtime] [--output FILE]
+                 [--calibrate] [--server host:port] [--record FILE]"""
+
+
+import sys, time, socket, struct, select, threading, argparse, itertools, re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import robotmodel
+from controller import JointController
+from simpleAgent import NaoRobot, CYCLE_LENGTH
+
+# ============================================================================ #
+
+# Constants
+GRAVITY = 9.81 # m/s^2
+
+# searched if nothing else is given, ranges (low, high) for random search
+DEFAULT_SPACE = {'maxhjSpeed': (4.0, 7.035),
+                 'accuracy':   (0.05, 0.5),
+                 'kp':         (0.3, 1.0)}
+DEFAULT_GRID  = {'maxhjSpeed': [5.0, 6.0, 7.035],
+                 'accuracy':   [0.05, 0.1, 0.2],
+                 'kp':         [0.5, 0.7, 0.9]}
+
+EFFECTOR = re.compile(r'\((\w+) (-?[0-9.]+)\)')
+
+# ============================================================================ #
+
+class KinematicServer(object):
+    """Local stand-in of the simulation server for one robot
+    Every cycle each hinge joint moves by gain times the speed its effector
+    received delay cycles before, within the joint limits of the model.
+    The torso stands still and upright, there is nothing to see.
+    In lockstep mode the server answers every message of the agent with the
+    next frame. Agents must then be created with sync=True, so they send
+    a message every cycle. After init the agent perceives once more before
+    its first step, so init is answered with two frames.
+    In real time mode a frame is sent every cycle, whether the agent keeps
+    up or not."""
+
+    def __init__(self, model, gain=1.0, delay=1, realtime=False):
+        self.model    = model
+        self.gain     = gain
+        self.realtime = realtime
+        self.cycle    = 0
+        self.angles   = np.zeros(len(model))
+        self.rates    = np.zeros(len(model))
+        self.pending  = deque(np.zeros(len(model)) for i in range(delay))
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.bind(('localhost', 0))
+        self.listener.listen(1)
+        self.port     = self.listener.getsockname()[1]
+
+        self.thread   = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+# ==================================== #
+
+    def serve(self):
+        """Serve one agent until it disconnects or the frames run out"""
+
+        connection, address = self.listener.accept()
+        self.listener.close()
+        buffer   = bytearray()
+        deadline = time.time()
+
+        try:
+            while True:
+                if self.realtime:
+                    wait = max(deadline - time.time(), 0.0)
+                    if select.select([connection], [], [], wait)[0]:
+                        if self.receive(connection, buffer) is None:
+                            return
+                        continue
+                    if not self.send(connection):
+                        return
+                    deadline += CYCLE_LENGTH
+                else:
+                    messages = self.receive(connection, buffer)
+                    if messages is None:
+                        return
+                    for message in messages:
+                        for i in range(2 if message.startswith('(init') else 1):
+                            if not self.send(connection):
+                                return
+        except OSError:
+            pass
+        finally:
+            connection.close()
+
+# ==================================== #
+
+    def receive(self, connection, buffer):
+        """Read from the agent and apply the effector messages
+        Return the complete messages, None if the agent is gone."""
+
+        data = connection.recv(65536)
+        if len(data) == 0:
+            return None
+        buffer += data
+
+        messages = []
+        while len(buffer) >= 4:
+            length = struct.unpack_from('!I', buffer)[0]
+            if len(buffer) < 4 + length:
+                break
+            message = str(buffer[4:4+length], 'ASCII')
+            del buffer[:4+length]
+            messages.append(message)
+
+            for name, rate in EFFECTOR.findall(message):
+                if name in self.model.effectorIndex:
+                    self.rates[self.model.effectorIndex[name]] = float(rate)
+
+        return messages
+
+# ==================================== #
+
+    def send(self, connection):
+        """Advance one cycle and send the perceptor message
+        Return False if there is nothing left to send."""
+
+        message = self.frame()
+        if message is None:
+            return False
+        message = bytes(message, 'ASCII')
+        connection.sendall(struct.pack('!I', len(message)) + message)
+        self.cycle += 1
+        return True
+
+# ==================================== #
+
+    def frame(self):
+        """Perceptor message of the current cycle"""
+
+        self.pending.append(np.clip(self.rates, -self.model.maxSpeed, self.model.maxSpeed))
+        self.angles += self.gain * self.pending.popleft()
+        np.clip(self.angles, self.model.hjMin, self.model.hjMax, out=self.angles)
+
+        now    = self.cycle * CYCLE_LENGTH
+        parts  = ["(time (now {:.2f}))(GS (t {:.2f}) (pm PlayOn))".format(now, now),
+                  "(GYR (n torso) (rt 0.00 0.00 0.00))(ACC (n torso) (a 0.00 0.00 {:.2f}))".format(GRAVITY)]
+        parts += ["(HJ (n {}) (ax {:.2f}))".format(name, angle)
+                  for name, angle in zip(self.model.perceptors, self.angles)]
+        parts += ["(FRP (n {}) (c 0.00 0.00 0.00) (f 0.00 0.00 22.50))".format(foot)
+                  for foot in ('lf', 'rf')]
+        return ''.join(parts)
+
+
+# ============================================================================ #
+
+
+class LogServer(KinematicServer):
+    """Stand-in of the simulation server that replays recorded perceptor
+    messages, see read_log(). Effectors are ignored, the joints move as
+    recorded. The episode ends with the log."""
+
+    def __init__(self, model, path, realtime=False):
+        self.messages = read_log(path)
+        super().__init__(model, realtime=realtime)
+
+    def frame(self):
+        if self.cycle >= len(self.messages):
+            return None
+        return self.messages[self.cycle]
+
+
+# ============================================================================ #
+
+def apply_parameters(robot, parameters):
+    """Set the parameters on the robot's JointController or the robot,
+    whichever has an attribute of that name, in that order"""
+
+    for name, value in parameters.items():
+        for owner in (robot.controller, robot):
+            if hasattr(owner, name):
+                current = getattr(owner, name)
+                if isinstance(current, np.ndarray):
+                    current[:] = value
+                else:
+                    setattr(owner, name, value)
+                break
+        else:
+            raise AttributeError("Unknown parameter '{}'".format(name))
+
+# ==================================== #
+
+def run_episode(parameters, seed, cycles=500, moves=10, log=None, realtime=False,
+        response=None, address=None, recorder=None):
+    """Run one headless episode and return its metrics as a dictionary
+    The robot moves a few random joints to random angles, moves times in a
+    row, each time waiting until all of them arrived or 100 cycles passed.
+    response is the (gain, delay) of the joints, used by the kinematic
+    model and the JointController. With address, (host, port), the robot
+    plays against that server instead of a local stand-in. recorder is
+    called with the robot and the received messages after every step."""
+
+    model  = robotmodel.load_model()
+    if address is not None:
+        host, port = address
+    elif log is None:
+        host, port = 'localhost', KinematicServer(model, *(response or ()), realtime=realtime).port
+    else:
+        host, port = 'localhost', LogServer(model, log, realtime=realtime).port
+
+    robot = NaoRobot(1, 'tuning', host=host, port=port, autostart=False, sync=not realtime)
+    robot.msched.clear()
+    if response is not None:
+        robot.controller.gain[:] = response[0]
+        robot.controller.set_delay(response[1])
+    apply_parameters(robot, parameters)
+
+    rng       = np.random.default_rng(seed)
+    completed = 0
+    timeouts  = 0
+    overshoot = 0.0
+    error     = 0.0
+    moveCycles = 0
+    cycle     = 0
+    move      = None
+
+    try:
+        while cycle < cycles:
+            if move is None and completed + timeouts < moves:
+                joints = rng.choice(len(model), size=rng.integers(1, 5), replace=False)
+                targets = rng.uniform(model.hjMin[joints], model.hjMax[joints])
+                start   = robot.hj.values[joints].copy()
+                done    = [[False] for i in joints]
+                for i, target, flag in zip(joints, targets, done):
+                    robot.msched.append([robot.move_hj_to,
+                        {'hj': model.perceptors[i], 'angle': target, 'speed': 100}, flag])
+                move = cycle
+
+            messages = robot.pns.receive_messages()
+            robot.step(messages)
+            if recorder is not None:
+                recorder(robot, messages)
+            cycle += 1
+
+            if move is not None:
+                # how far the joints went beyond their targets
+                direction = np.sign(targets - start)
+                overshoot = max(overshoot, ((robot.hj.values[joints] - targets) * direction).max())
+
+                if all(flag[0] for flag in done):
+                    completed  += 1
+                    moveCycles += cycle - move
+                    error      += np.abs(robot.hj.values[joints] - targets).mean()
+                    move        = None
+                elif cycle - move >= 100:
+                    timeouts   += 1
+                    moveCycles += cycle - move
+                    robot.msched.clear()
+                    robot.controller.stop()
+                    move        = None
+
+            if move is None and completed + timeouts == moves:
+                break
+    except OSError:
+        pass
+    finally:
+        robot.die()
+
+    stats = robot.stats
+    return {'seed':       seed,
+            'cycles':     cycle,
+            'completed':  completed,
+            'timeouts':   timeouts,
+            'moveCycles': moveCycles / max(completed + timeouts, 1),
+            'error':      error / max(completed, 1),
+            'overshoot':  max(overshoot, 0.0),
+            'skipped':    stats.skipped,
+            'compute':    stats.computeTime / max(stats.cycles, 1),
+            'maxCompute': stats.maxCompute}
+
+# ==================================== #
+
+class Recorder(object):
+    """Keeps the perceptor messages, the perceived angles and the speeds in
+    effect of every cycle of an episode, see run_episode()"""
+
+    def __init__(self):
+        self.messages = []
+        self.angles   = []
+        self.rates    = []
+
+    def __call__(self, robot, messages):
+        self.messages.extend(messages)
+        self.angles.append(robot.hj.values.copy())
+        self.rates.append(robot.he.values.copy())
+
+# ==================================== #
+
+def calibrate(seed=0, record=None, **options):
+    """Fit the joint response, gain and delay, to the angles and speeds of
+    one episode, see JointController.calibrate(). options are passed to
+    run_episode(), e.g. address to calibrate against the simulation server.
+    A log cannot be used, LogServer replays the recorded angles whatever
+    speeds the robot sends. If record is given, the perceptor messages are
+    written to that log. Return gain and delay."""
+
+    if options.get('log') is not None:
+        raise ValueError("Cannot calibrate against a replayed log, it ignores the effectors.")
+
+    recorder = Recorder()
+    run_episode({}, seed, recorder=recorder, **options)
+    if record is not None:
+        write_log(record, recorder.messages)
+
+    joints = JointController(robotmodel.load_model())
+    return joints.calibrate(recorder.angles, recorder.rates)
+
+# ==================================== #
+
+def _episode(job):
+    parameters, seed, options = job
+    result = run_episode(parameters, seed, **options)
+    result.update(parameters)
+    return result
+
+# ==================================== #
+
+def grid(space):
+    """All combinations of the values listed for every parameter"""
+    names = sorted(space)
+    for values in itertools.product(*(space[name] for name in names)):
+        yield dict(zip(names, values))
+
+def random_search(space, samples, seed=None):
+    """samples parameter sets drawn uniformly from the (low, high) range,
+    or from the list of values, given for every parameter"""
+    rng = np.random.default_rng(seed)
+    for i in range(samples):
+        parameters = {}
+        for name in sorted(space):
+            values = space[name]
+            if isinstance(values, tuple):
+                parameters[name] = float(rng.uniform(*values))
+            else:
+                parameters[name] = values[rng.integers(len(values))]
+        yield parameters
+
+# ==================================== #
+
+def tune(candidates, episodes=4, workers=None, output='tuning.npz', **options):
+    """Run episodes episodes for every parameter set in candidates on
+    workers processes (default: all cores) and store the results in output.
+    Every parameter set is run with the same seeds. Return the results as
+    a dictionary of columns."""
+
+    jobs = [(parameters, seed, options)
+            for parameters in candidates for seed in range(episodes)]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        rows = list(executor.map(_episode, jobs, chunksize=max(1, len(jobs) // 64)))
+
+    columns = {name: np.array([row[name] for row in rows]) for name in rows[0]}
+    np.savez_compressed(output, **columns)
+
+    return columns
+
+# ==================================== #
+
+def load_results(path):
+    """Read the columns stored by tune()"""
+    with np.load(path) as data:
+        return {name: data[name] for name in data.files}
+
+# ==================================== #
+
+def summarize(columns, parameters):
+    """Print the parameter sets ordered by their mean cycles per move"""
+
+    keys = list(zip(*(columns[name] for name in parameters)))
+    scores = {}
+    for key, cycles, timeouts in zip(keys, columns['moveCycles'], columns['timeouts']):
+        scores.setdefault(key, []).append(cycles + 100 * timeouts)
+
+    ranking = sorted(scores.items(), key=lambda item: np.mean(item[1]))
+    print(" ".join("{:>12}".format(name) for name in parameters), "  cycles/move")
+    for key, score in ranking[:10]:
+        print(" ".join("{:12.4g}".format(value) for value in key), "  {:11.2f}".format(np.mean(score)))
+
+# ============================================================================ #
+
+#####################
+# UTILITY FUNCTIONS #
+#####################
+
+def write_log(path, messages):
+    """Append perceptor messages as received by PNS.receive_messages()
+    to a log, length prefixed like on the wire"""
+    with open(path, 'ab') as logFile:
+        for message in messages:
+            message = bytes(message, 'ASCII')
+            logFile.write(struct.pack('!I', len(message)) + message)
+
+def read_log(path):
+    """Return all perceptor messages of a log written by write_log()"""
+    with open(path, 'rb') as logFile:
+        data = logFile.read()
+    messages = []
+    offset   = 0
+    while offset + 4 <= len(data):
+        length = struct.unpack_from('!I', data, offset)[0]
+        messages.append(str(data[offset+4:offset+4+length], 'ASCII'))
+        offset += 4 + length
+    return messages
+
+# ==================================== #
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Tune agent parameters in simulated episodes")
+    parser.add_argument('--grid',     action='store_true', help="search the default grid")
+    parser.add_argument('--samples',  type=int, default=20, help="random parameter sets")
+    parser.add_argument('--episodes', type=int, default=4,  help="episodes per parameter set")
+    parser.add_argument('--cycles',   type=int, default=500, help="maximum cycles per episode")
+    parser.add_argument('--workers',  type=int, default=None)
+    parser.add_argument('--log',      default=None, help="replay this perceptor log")
+    parser.add_argument('--realtime', action='store_true', help="send frames every 20 ms")
+    parser.add_argument('--output',   default='tuning.npz')
+    parser.add_argument('--calibrate', action='store_true', help="fit gain and delay of the joints first")
+    parser.add_argument('--server',   default=None, help="host:port to calibrate against")
+    parser.add_argument('--record',   default=None, help="write the calibration episode to this log")
+    args = parser.parse_args(argv)
+    if args.calibrate and args.log is not None:
+        parser.error("--calibrate needs a server that reacts to the effectors, not --log")
+
+    response = None
+    if args.calibrate:
+        address = None
+        if args.server is not None:
+            host, port = args.server.split(':')
+            address    = (host, int(port))
+        gain, delay = calibrate(cycles=args.cycles, realtime=args.realtime,
+                address=address, record=args.record)
+        response = (gain.copy(), delay)
+        print("delay {} cycles, gain {:.3f} .. {:.3f}".format(delay, gain.min(), gain.max()))
+
+    if args.grid:
+        space      = DEFAULT_GRID
+        candidates = list(grid(space))
+    else:
+        space      = DEFAULT_SPACE
+        candidates = list(random_search(space, args.samples))
+
+    start   = time.time()
+    columns = tune(candidates, episodes=args.episodes, workers=args.workers,
+            output=args.output, cycles=args.cycles, log=args.log, realtime=args.realtime,
+            response=response)
+    print("{} episodes in {:.1f} sec., results in {}".format(
+        len(columns['seed']), time.time() - start, args.output))
+    summarize(columns, sorted(space))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
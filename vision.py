@@ -0,0 +1,281 @@
+#! /usr/bin/env python3
+
+
+import numpy as np
+
+# ============================================================================ #
+
+# Constants
+LANDMARKS  = ('F1L', 'F2L', 'F1R', 'F2R', 'G1L', 'G2L', 'G1R', 'G2R')
+MAXPLAYERS = 22 # players of both teams
+MAXLINES   = 32 # field lines visible at once
+
+# kinds of objects in the spatial index
+LANDMARK   = 0
+BALL       = 1
+TEAMMATE   = 2
+OPPONENT   = 3
+
+# ============================================================================ #
+
+class Vision(object):
+    """Decoded state of the 'See' perceptor
+    All coordinates are relative to the camera of the robot.
+    Polar coordinates are (distance, horizontal angle, vertical angle) with
+    angles in degree, cartesian coordinates are (x, y, z) with x pointing
+    straight ahead of the camera.
+    All data lives in one preallocated array, so that the polar to cartesian
+    conversion of all seen objects is done in a single vectorized step."""
+
+    def __init__(self, teamname=None):
+        self.teamname = teamname
+
+        # row layout of the polar/cartesian arrays
+        self.landmarkRows = slice(0, len(LANDMARKS))
+        self.ballRow      = len(LANDMARKS)
+        self.playerRows   = slice(self.ballRow + 1, self.ballRow + 1 + MAXPLAYERS)
+        self.lineRows     = slice(self.playerRows.stop, self.playerRows.stop + 2*MAXLINES)
+        nrows             = self.lineRows.stop
+
+        self.polar     = np.zeros((nrows, 3))
+        self.cartesian = np.zeros((nrows, 3))
+        self.visible   = np.zeros(nrows, dtype=bool)
+
+        self.landmarkIndex = {name: i for i, name in enumerate(LANDMARKS)}
+
+        # views into the row blocks
+        self.landmarkPolar   = self.polar    [self.landmarkRows]
+        self.landmarkPos     = self.cartesian[self.landmarkRows]
+        self.landmarkVisible = self.visible  [self.landmarkRows]
+        self.ballPolar       = self.polar    [self.ballRow]
+        self.ballPos         = self.cartesian[self.ballRow]
+        self.playerPolar     = self.polar    [self.playerRows]
+        self.playerPos       = self.cartesian[self.playerRows]
+        self.linePolar       = self.polar    [self.lineRows].reshape(MAXLINES, 2, 3)
+        self.linePos         = self.cartesian[self.lineRows].reshape(MAXLINES, 2, 3)
+
+        # player identities
+        self.playerID  = np.zeros(MAXPLAYERS, dtype=np.int32)
+        self.playerOwn = np.zeros(MAXPLAYERS, dtype=bool)
+        self.nplayers  = 0
+        self.nlines    = 0
+
+        self.index = SpatialIndex(self)
+
+# ==================================== #
+
+    def update(self, objects):
+        """Decode the list of seen objects of a parsed 'See' perceptor,
+        i.e. everything following the 'See' keyword"""
+
+        self.visible[:] = False
+        nplayers = 0
+        nlines   = 0
+        lineRow  = self.lineRows.start
+
+        for obj in objects:
+            name = obj[0]
+
+            # ball
+            if name == 'B':
+                self.polar[self.ballRow] = obj[1][1:4]
+                self.visible[self.ballRow] = True
+
+            # flags and goal posts
+            elif name in self.landmarkIndex:
+                row = self.landmarkIndex[name]
+                self.polar[row] = obj[1][1:4]
+                self.visible[row] = True
+
+            # other players, located by their head if visible
+            elif name == 'P':
+                if nplayers == MAXPLAYERS:
+                    continue
+                team  = None
+                unum  = 0
+                polar = None
+                for field in obj[1:]:
+                    if field[0] == 'team':
+                        team = field[1]
+                    elif field[0] == 'id':
+                        unum = field[1]
+                    elif polar is None or field[0] == 'head':
+                        polar = field[1][1:4]
+                if polar is None:
+                    continue
+                row = self.playerRows.start + nplayers
+                self.polar[row]              = polar
+                self.visible[row]            = True
+                self.playerID [nplayers]     = unum
+                self.playerOwn[nplayers]     = (team == self.teamname)
+                nplayers += 1
+
+            # field lines, given by their two end points
+            elif name == 'L':
+                if nlines == MAXLINES:
+                    continue
+                self.polar[lineRow  ] = obj[1][1:4]
+                self.polar[lineRow+1] = obj[2][1:4]
+                self.visible[lineRow:lineRow+2] = True
+                lineRow += 2
+                nlines  += 1
+
+        self.nplayers = nplayers
+        self.nlines   = nlines
+
+        polar2cartesian(self.polar, out=self.cartesian)
+        self.index.rebuild()
+
+# ==================================== #
+
+    def ball_visible(self):
+        return self.visible[self.ballRow]
+
+    def get_ball(self):
+        """Cartesian ball position or None if the ball is not visible"""
+        if self.visible[self.ballRow]:
+            return self.ballPos
+        return None
+
+    def get_landmark(self, name):
+        """Cartesian position of the named flag or goal post
+        or None if it is not visible"""
+        row = self.landmarkIndex[name]
+        if self.visible[row]:
+            return self.landmarkPos[row]
+        return None
+
+    def get_landmarks(self):
+        """Return names, polar and cartesian coordinates of all visible landmarks"""
+        mask  = self.landmarkVisible
+        names = [name for name, seen in zip(LANDMARKS, mask) if seen]
+        return names, self.landmarkPolar[mask], self.landmarkPos[mask]
+
+    def get_players(self, own=None):
+        """Return IDs and cartesian positions of the visible players.
+        If own is True or False, only return team mates or opponents."""
+        ids       = self.playerID [:self.nplayers]
+        positions = self.playerPos[:self.nplayers]
+        if own is None:
+            return ids, positions
+        mask = self.playerOwn[:self.nplayers] == own
+        return ids[mask], positions[mask]
+
+    def get_lines(self):
+        """Cartesian end points of all visible field lines"""
+        return self.linePos[:self.nlines]
+
+
+# ============================================================================ #
+
+
+class SpatialIndex(object):
+    """Index of the objects seen in the current cycle for nearest object and
+    within radius queries.
+    With at most a few dozen objects in view, a contiguous array that is
+    scanned with one vectorized distance computation beats any tree
+    structure, so that is what the index is."""
+
+    def __init__(self, vision):
+        self.vision = vision
+        n = 1 + len(LANDMARKS) + MAXPLAYERS
+
+        # positions, kinds and ids of indexed objects, first nobjects are valid
+        self.positions = np.zeros((n, 3))
+        self.kinds     = np.zeros(n, dtype=np.int8)
+        self.ids       = np.zeros(n, dtype=np.int32)
+        self.nobjects  = 0
+
+# ==================================== #
+
+    def rebuild(self):
+        """Re-index the objects of the current cycle"""
+
+        vision = self.vision
+        n      = 0
+
+        if vision.visible[vision.ballRow]:
+            self.positions[n] = vision.ballPos
+            self.kinds    [n] = BALL
+            self.ids      [n] = 0
+            n += 1
+
+        landmarks = np.flatnonzero(vision.landmarkVisible)
+        m = len(landmarks)
+        self.positions[n:n+m] = vision.landmarkPos[landmarks]
+        self.kinds    [n:n+m] = LANDMARK
+        self.ids      [n:n+m] = landmarks
+        n += m
+
+        m = vision.nplayers
+        self.positions[n:n+m] = vision.playerPos[:m]
+        self.kinds    [n:n+m] = np.where(vision.playerOwn[:m], TEAMMATE, OPPONENT)
+        self.ids      [n:n+m] = vision.playerID[:m]
+        n += m
+
+        self.nobjects = n
+
+# ==================================== #
+
+    def _distances(self, point, kind):
+        """Squared distances of point to all indexed objects of given kind
+        Returns the distances and the corresponding rows in the index"""
+        positions = self.positions[:self.nobjects]
+        if kind is None:
+            rows = np.arange(self.nobjects)
+        else:
+            rows = np.flatnonzero(self.kinds[:self.nobjects] == kind)
+            positions = positions[rows]
+        diff = positions - point
+        return np.einsum('ij,ij->i', diff, diff), rows
+
+# ==================================== #
+
+    def nearest(self, point=(0.0, 0.0, 0.0), kind=None):
+        """Return (kind, id, position, distance) of the object nearest to
+        point, optionally restricted to one kind, or None if there is none"""
+
+        dist2, rows = self._distances(point, kind)
+        if len(rows) == 0:
+            return None
+        i   = np.argmin(dist2)
+        row = rows[i]
+        return self.kinds[row], self.ids[row], self.positions[row], np.sqrt(dist2[i])
+
+# ==================================== #
+
+    def within(self, radius, point=(0.0, 0.0, 0.0), kind=None):
+        """Return kinds, ids and positions of all objects within radius of
+        point, optionally restricted to one kind, sorted by distance"""
+
+        dist2, rows = self._distances(point, kind)
+        mask  = dist2 <= radius*radius
+        rows  = rows[mask]
+        rows  = rows[np.argsort(dist2[mask])]
+        return self.kinds[rows], self.ids[rows], self.positions[rows]
+
+
+# ============================================================================ #
+
+#####################
+# UTILITY FUNCTIONS #
+#####################
+
+def polar2cartesian(polar, out=None):
+    """Convert an array of (distance, horizontal angle, vertical angle) rows
+    with angles in degree to cartesian (x, y, z) rows"""
+
+    polar = np.asarray(polar, dtype=float)
+    if out is None:
+        out = np.empty(polar.shape)
+
+    distance   = polar[..., 0]
+    horizontal = np.radians(polar[..., 1])
+    vertical   = np.radians(polar[..., 2])
+    projected  = distance * np.cos(vertical)
+
+    out[..., 0] = projected * np.cos(horizontal)
+    out[..., 1] = projected * np.sin(horizontal)
+    out[..., 2] = distance  * np.sin(vertical)
+
+    return out
@@ -0,0 +1,146 @@
+#! /usr/bin/env python3
+
+
+import copy
+import threading
+import numpy as np
+
+from buffers import DoubleBuffer
+
+# ============================================================================ #
+
+class FusedState(object):
+    """Team view of the game as fused by the TeamWorldModel
+    Positions are global field coordinates (x, y), teammates also carry
+    their orientation. Index i holds player number i+1.
+    A confidence of 0 means nobody has reported the object."""
+
+    def __init__(self, nplayers=11):
+        self.time               = 0.0
+        self.ball               = np.zeros(2)
+        self.ballConfidence     = 0.0
+        self.teammates          = np.zeros((nplayers, 3))
+        self.teammateConfidence = np.zeros(nplayers)
+        self.opponents          = np.zeros((nplayers, 2))
+        self.opponentConfidence = np.zeros(nplayers)
+
+# ==================================== #
+
+    def copy(self):
+        return copy.deepcopy(self)
+
+
+# ============================================================================ #
+
+
+class TeamWorldModel(object):
+    """World model shared by all agents of a team that run in one process
+    Every agent reports what it perceived in its cycle. The model keeps the
+    latest observation of every reporter and fuses them, weighting each by
+    its confidence and by its age with an exponential decay of the given
+    half life in seconds.
+    A report only replaces the reporter's own rows, and fusing is a weighted
+    mean over at most nplayers rows, so the model is updated incrementally
+    as the frames of the individual agents arrive.
+    The fused state is published through a DoubleBuffer; readers never lock.
+    Reports from different agent threads are serialized by a lock."""
+
+    def __init__(self, nplayers=11, halfLife=1.0):
+        self.nplayers = nplayers
+        self.halfLife = halfLife
+        self.lock     = threading.Lock()
+
+        # latest ball observation of every reporter
+        self.ballPos        = np.zeros((nplayers, 2))
+        self.ballTime       = np.zeros(nplayers)
+        self.ballConfidence = np.zeros(nplayers)
+
+        # latest self-localization of every team mate
+        self.teammatePos        = np.zeros((nplayers, 3))
+        self.teammateTime       = np.zeros(nplayers)
+        self.teammateConfidence = np.zeros(nplayers)
+
+        # latest opponent observations, reporter x opponent number
+        self.opponentPos        = np.zeros((nplayers, nplayers, 2))
+        self.opponentTime       = np.zeros((nplayers, nplayers))
+        self.opponentConfidence = np.zeros((nplayers, nplayers))
+
+        self.state = DoubleBuffer(FusedState(nplayers), FusedState(nplayers))
+
+# ==================================== #
+
+    def report(self, unum, time, pose=None, poseConfidence=1.0,
+            ball=None, ballTime=None, ballConfidence=1.0,
+            opponentIDs=(), opponents=(), opponentConfidence=1.0):
+        """Report the observations of player unum at the given game time.
+        pose            own pose (x, y, theta) from self-localization
+        ball            global ball position, seen at ballTime (default: time)
+        opponentIDs     player numbers of the seen opponents
+        opponents       their global positions
+        Observations older than the ones stored for this reporter are
+        ignored, e.g. a heard message of a team mate that reports
+        directly in this process."""
+
+        if not 1 <= unum <= self.nplayers:
+            raise ValueError("No player number {} in a team of {}".format(unum, self.nplayers))
+        i = unum - 1
+        if ballTime is None:
+            ballTime = time
+
+        with self.lock:
+            if pose is not None and time >= self.teammateTime[i]:
+                self.teammatePos[i]        = pose[:3]
+                self.teammateTime[i]       = time
+                self.teammateConfidence[i] = poseConfidence
+
+            if ball is not None and ballTime >= self.ballTime[i]:
+                self.ballPos[i]        = ball[:2]
+                self.ballTime[i]       = ballTime
+                self.ballConfidence[i] = ballConfidence
+
+            for opponentID, position in zip(opponentIDs, opponents):
+                if 1 <= opponentID <= self.nplayers and time >= self.opponentTime[i, opponentID-1]:
+                    self.opponentPos       [i, opponentID-1] = position[:2]
+                    self.opponentTime      [i, opponentID-1] = time
+                    self.opponentConfidence[i, opponentID-1] = opponentConfidence
+
+            self._fuse(time)
+
+# ==================================== #
+
+    def _fuse(self, time):
+        """Fuse the latest observations and publish the result"""
+
+        state      = self.state.back
+        state.time = time
+
+        weights = self._weights(self.ballConfidence, self.ballTime, time)
+        state.ballConfidence = weights.sum()
+        if state.ballConfidence > 0:
+            state.ball[:] = np.dot(weights, self.ballPos) / state.ballConfidence
+
+        # every team mate reports its own pose, nothing to fuse
+        state.teammates[:]          = self.teammatePos
+        state.teammateConfidence[:] = self._weights(self.teammateConfidence,
+                self.teammateTime, time)
+
+        weights = self._weights(self.opponentConfidence, self.opponentTime, time)
+        state.opponentConfidence[:] = weights.sum(axis=0)
+        seen = state.opponentConfidence > 0
+        state.opponents[seen] = (np.einsum('ij,ijk->jk', weights, self.opponentPos)[seen]
+                                 / state.opponentConfidence[seen, None])
+
+        self.state.publish()
+
+# ==================================== #
+
+    def _weights(self, confidence, times, time):
+        """Confidence decayed with the age of the observation"""
+        return confidence * 0.5**(np.maximum(time - times, 0.0) / self.halfLife)
+
+# ==================================== #
+
+    def get_state(self):
+        """Return a consistent copy of the fused team state
+        Safe to call from any thread"""
+        return self.state.read()